@@ -0,0 +1,220 @@
+'''
+BALANCE RUNS
+Plays many seeded headless games with a scripted or random player across a
+process pool and reports survival, kills, score and damage taken per monster
+type, for every point of a parameter grid.
+
+    python balance.py --games 500                                 # current settings
+    python balance.py --set 3.atk=12,18,24 --set base_spawn_interval=40,60
+    python balance.py --policy swordsman --ticks 30000 --json sweep.json
+
+Parameters are monster stats as TYPE.STAT (1.atk, 2.speed, 3.weight,
+4.bullet_cooldown), the spawn pacing attributes base_spawn_interval and
+min_spawn_interval, or an integer setting in main.py such as
+ITEM_SPAWN_INTERVAL_FRAMES or MONSTER_CAP.
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import main
+
+
+
+# --- Parameters ---------------------------------------------------------------
+# Set on each new Game rather than in main.py's module settings
+GAME_PARAMS = ('base_spawn_interval', 'min_spawn_interval')
+# Settings main.py only reads as default arguments, bound when it was imported,
+# so overriding them in a worker would silently change nothing
+# (MONSTER_CAP is passed to each Game explicitly instead)
+DEFAULT_ARG_SETTINGS = ('BULLET_POOL_LIMIT', 'NEAREST_BUCKET_SIZE', 'FOV_RADIUS',
+                        'MAX_CATCHUP_TICKS', 'CAST_QUEUE_FRAMES')
+
+
+def parse_set(text):
+    """'3.atk=12,18' -> ('3.atk', [12, 18])"""
+    name, _, values = text.partition('=')
+    if not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,...: {text!r}")
+    mtype, _, stat = name.partition('.')
+    if stat:
+        if not mtype.isdigit() or stat not in main.monster_stats.get(int(mtype), {}):
+            raise argparse.ArgumentTypeError(f"no monster stat {name!r}")
+    elif name in DEFAULT_ARG_SETTINGS:
+        raise argparse.ArgumentTypeError(f"{name} is only a default argument in main.py and cannot be swept")
+    elif name not in GAME_PARAMS and not isinstance(getattr(main, name, None), int):
+        raise argparse.ArgumentTypeError(f"unknown parameter {name!r}")
+    try:
+        return name, [int(v) for v in values.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"values must be integers: {text!r}")
+
+
+def grid(sets):
+    """Every combination of the --set values, as a list of {name: value} dicts."""
+    names = [name for name, _ in sets]
+    return [dict(zip(names, combo)) for combo in itertools.product(*(values for _, values in sets))]
+
+
+@contextmanager
+def settings(params):
+    """Apply monster stat and module setting overrides, restoring them afterwards."""
+    saved_stats = {t: dict(s) for t, s in main.monster_stats.items()}
+    saved_globals = {}
+    try:
+        for name, value in params.items():
+            mtype, _, stat = name.partition('.')
+            if stat:
+                # Monsters read their stats by reference, so edit the dicts in place
+                main.monster_stats[int(mtype)][stat] = value
+            elif name not in GAME_PARAMS:
+                saved_globals[name] = getattr(main, name)
+                setattr(main, name, value)
+        yield
+    finally:
+        for t, s in saved_stats.items():
+            main.monster_stats[t].clear()
+            main.monster_stats[t].update(s)
+        for name, value in saved_globals.items():
+            setattr(main, name, value)
+# ------------------------------------------------------------------------------
+
+
+
+# --- Player Policies ----------------------------------------------------------
+RANDOM_KEYS = (None, 'w', 'a', 's', 'd', 'i', 'j', 'k', 'l')
+
+
+def idle(game, rng):
+    return None
+
+
+def random_keys(game, rng):
+    return rng.choice(RANDOM_KEYS)
+
+
+def swordsman(game, rng):
+    """Swing at the nearest monster when it is lined up within reach, else wander."""
+    p = game.player
+    found = game.nearest_monsters(p.row, p.col, 1, radius=p.length)
+    if found:
+        m = found[0]
+        if m.row == p.row: return 'l' if m.col > p.col else 'j'
+        if m.col == p.col: return 'k' if m.row > p.row else 'i'
+    return rng.choice('wasd') if rng.random() < 0.5 else None
+
+
+POLICIES = {'idle': idle, 'random': random_keys, 'swordsman': swordsman}
+# ------------------------------------------------------------------------------
+
+
+
+# --- Runner -------------------------------------------------------------------
+def play(task):
+    """Play one game to death or the tick limit and return its outcome.
+    Runs in a worker process, so arguments and result are plain data."""
+    params, seed, policy, max_ticks, (width, height) = task
+    main.WIDTH, main.HEIGHT = width, height
+    with settings(params):
+        game = main.Game(monster_cap=main.MONSTER_CAP, seed=seed)
+        for name in GAME_PARAMS:
+            if name in params:
+                setattr(game, name, params[name])
+        game.spawn_timer = game.base_spawn_interval
+        choose = POLICIES[policy]
+        rng = random.Random(seed)
+        while game.frame_count < max_ticks and not game.is_over:
+            game.step(choose(game, rng))
+    return {
+        'ticks': game.frame_count,
+        'seconds': game.elapsed,
+        'died': game.is_over,
+        'kills': game.kill_count,
+        'score': game.score,
+        'damage': game.damage_taken,
+    }
+
+
+def run_grid(points, games, policy, max_ticks, size, seed, workers):
+    """Play `games` seeds at every grid point; return [(params, [outcome, ...])]."""
+    tasks = [(params, seed + i, policy, max_ticks, size) for params in points for i in range(games)]
+    if workers == 1:
+        outcomes = list(map(play, tasks))
+    else:
+        chunk = max(1, len(tasks) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(play, tasks, chunksize=chunk))
+    return [(params, outcomes[i * games:(i + 1) * games]) for i, params in enumerate(points)]
+
+
+def summarize(outcomes):
+    n = len(outcomes)
+    seconds = [o['seconds'] for o in outcomes]
+    damage = {}
+    for o in outcomes:
+        for t, amount in o['damage'].items():
+            damage[t] = damage.get(t, 0) + amount
+    return {
+        'games': n,
+        'death_rate': sum(o['died'] for o in outcomes) / n,
+        'survival_s_mean': statistics.fmean(seconds),
+        'survival_s_p50': statistics.median(seconds),
+        'kills_mean': statistics.fmean(o['kills'] for o in outcomes),
+        'score_mean': statistics.fmean(o['score'] for o in outcomes),
+        'damage_mean': {t: damage[t] / n for t in sorted(damage)},
+    }
+# ------------------------------------------------------------------------------
+
+
+
+# --- Reporting ----------------------------------------------------------------
+def print_report(rows):
+    print(f"{'parameters':<40}{'games':>7}{'died':>7}{'surv s':>9}{'p50 s':>9}{'kills':>8}{'score':>9}"
+          f"  damage/game by monster")
+    for params, r in rows:
+        label = ' '.join(f"{k}={v}" for k, v in params.items()) or '(current settings)'
+        damage = ' '.join(f"{main.monster_stats[t]['char']}{d:.0f}" for t, d in r['damage_mean'].items())
+        print(f"{label:<40}{r['games']:>7}{r['death_rate']:>7.0%}{r['survival_s_mean']:>9.1f}"
+              f"{r['survival_s_p50']:>9.1f}{r['kills_mean']:>8.1f}{r['score_mean']:>9.0f}  {damage}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Batch-simulate seeded games to balance monster stats and pacing")
+    parser.add_argument('--set', type=parse_set, action='append', default=[], metavar='NAME=V1,V2',
+                        help="sweep a parameter over these values (repeat for a grid)")
+    parser.add_argument('--games', type=int, default=200, help="games per grid point")
+    parser.add_argument('--ticks', type=int, default=20000, help="tick limit per game")
+    parser.add_argument('--policy', choices=POLICIES, default='swordsman')
+    parser.add_argument('--width', type=int, default=main.WIDTH)
+    parser.add_argument('--height', type=int, default=main.HEIGHT)
+    parser.add_argument('--seed', type=int, default=1, help="seed of the first game at each grid point")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--json', metavar='FILE', help="also write the summary as JSON")
+    args = parser.parse_args()
+
+    points = grid(args.set)
+    t0 = time.perf_counter()
+    results = run_grid(points, args.games, args.policy, args.ticks, (args.width, args.height),
+                       args.seed, args.workers)
+    rows = [(params, summarize(outcomes)) for params, outcomes in results]
+    took = time.perf_counter() - t0
+
+    print_report(rows)
+    print(f"{len(points) * args.games} games in {took:.1f} s on {args.workers} worker(s)", file=sys.stderr)
+
+    if args.json:
+        meta = {'games': args.games, 'ticks': args.ticks, 'policy': args.policy, 'seed': args.seed,
+                'width': args.width, 'height': args.height, 'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+        with open(args.json, 'w') as f:
+            json.dump({'meta': meta, 'results': [{'params': p, **r} for p, r in rows]}, f, indent=1)
+# ------------------------------------------------------------------------------
+
+if __name__ == '__main__': main_cli()
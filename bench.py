@@ -0,0 +1,243 @@
+'''
+TICK BENCHMARKS
+Times each hot path of a tick (monsters, bullets, player action, buffs,
+spawning, print_map) on scripted scenarios across several map sizes and
+reports ops/sec and latency percentiles.
+
+    python bench.py                          # run everything, print a table
+    python bench.py --save base.json         # keep a baseline
+    python bench.py --compare base.json      # diff against it (exit 1 on regressions)
+    python bench.py --scenarios bullets-10k --maps large --game array
+'''
+
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from contextlib import contextmanager
+
+import main
+
+
+
+# --- Scenarios ----------------------------------------------------------------
+MAPS = {
+    'small':  (40, 20),
+    'medium': (200, 100),
+    'large':  (400, 200),
+    'huge':   (1000, 1000),
+}
+
+# print_map draws through a fixed-size camera so results don't depend on the terminal
+VIEW_ROWS, VIEW_COLS = 50, 100
+
+# name: monsters, bullets, obstacle density, player actions cycled per tick, buffs,
+# fog of war. fog-1k is monsters-1k under fog; the walk pair steps onto a new cell
+# almost every tick, so the field of view is recomputed instead of reused.
+SCENARIOS = {
+    'baseline':        dict(monsters=25,    bullets=0,     density=main.OBSTACLE_DENSITY, actions='wdsa', buffs=(), fog=False),
+    'monsters-1k':     dict(monsters=1000,  bullets=0,     density=main.OBSTACLE_DENSITY, actions='wdsa', buffs=(), fog=False),
+    'monsters-10k':    dict(monsters=10000, bullets=0,     density=main.OBSTACLE_DENSITY, actions='wdsa', buffs=(), fog=False),
+    'bullets-100':     dict(monsters=25,    bullets=100,   density=main.OBSTACLE_DENSITY, actions='wdsa', buffs=(), fog=False),
+    'bullets-10k':     dict(monsters=25,    bullets=10000, density=main.OBSTACLE_DENSITY, actions='wdsa', buffs=(), fog=False),
+    'strength-sword':  dict(monsters=1000,  bullets=100,   density=main.OBSTACLE_DENSITY, actions='ijkl', buffs=('S',), fog=False),
+    'magic':           dict(monsters=1000,  bullets=0,     density=main.OBSTACLE_DENSITY, actions='wdsa', buffs=('M',), fog=False),
+    'dense-obstacles': dict(monsters=1000,  bullets=100,   density=0.3,                   actions='wdsa', buffs=(), fog=False),
+    'fog-1k':          dict(monsters=1000,  bullets=0,     density=main.OBSTACLE_DENSITY, actions='wdsa', buffs=(), fog=True),
+    'walk-1k':         dict(monsters=1000,  bullets=0,     density=main.OBSTACLE_DENSITY, actions='ddds', buffs=(), fog=False),
+    'fog-walk-1k':     dict(monsters=1000,  bullets=0,     density=main.OBSTACLE_DENSITY, actions='ddds', buffs=(), fog=True),
+}
+
+PHASES = ('player_action', 'buffs', 'monsters', 'bullets', 'spawns', 'print_map')
+
+# A scenario is skipped on maps where its entities would fill more than this share of the floor
+MAX_FILL = 0.5
+
+
+@contextmanager
+def map_settings(width, height, density):
+    """Temporarily resize the map (the game reads these module settings)."""
+    saved = main.WIDTH, main.HEIGHT, main.OBSTACLE_DENSITY
+    main.WIDTH, main.HEIGHT, main.OBSTACLE_DENSITY = width, height, density
+    try:
+        yield
+    finally:
+        main.WIDTH, main.HEIGHT, main.OBSTACLE_DENSITY = saved
+
+
+class _ByteCounter(io.TextIOBase):
+    """stdout stand-in that only counts what print_map writes."""
+
+    def __init__(self):
+        self.chars = 0
+
+    def write(self, s):
+        self.chars += len(s)
+        return len(s)
+# ------------------------------------------------------------------------------
+
+
+
+# --- Runner -------------------------------------------------------------------
+def make_game(game_cls, spec, seed):
+    game = game_cls(monster_cap=spec['monsters'] + spec['monsters'] // 10 + 5, seed=seed, fog=spec['fog'])
+    for t in spec['buffs']:
+        game.apply_item_effect(t)
+    return game
+
+
+def top_up(game, spec, rng):
+    """Keep the scenario's population steady between ticks (not timed)."""
+    game.player.hp = game.player.max_hp
+    for t in spec['buffs']:
+        if t == 'S': game.player.strength_timer = max(game.player.strength_timer, 2)
+        if t == 'M': game.player.magic_timer = max(game.player.magic_timer, 2)
+    for _ in range(spec['monsters'] - len(game.monsters)):
+        m = game.spawn_monster()
+        if m is None: break
+        game.add_monster(m)
+    for _ in range(spec['bullets'] - len(game.bullets)):
+        sr, sc = main.random_location(rng)
+        tr, tc = main.random_location(rng)
+        if (sr, sc) in game.obstacle_set: continue
+        game.add_bullet(main.make_bullet_towards(sr, sc, tr, tc, main.PLAYER_ATTACK, rng.random() < 0.5))
+
+
+def run_scenario(game_cls, spec, ticks, seed):
+    """Run `ticks` ticks and return {phase: [ns per call]} plus output chars per frame."""
+    rng = random.Random(seed)
+    game = make_game(game_cls, spec, seed)
+    renderer = main.DiffRenderer()
+    camera = main.Camera(VIEW_ROWS, VIEW_COLS)
+    sink = _ByteCounter()
+    samples = {phase: [] for phase in PHASES}
+    clock = time.perf_counter_ns
+    actions = spec['actions']
+
+    for tick in range(ticks):
+        top_up(game, spec, rng)
+        key = actions[tick % len(actions)]
+
+        t0 = clock(); game.process_player_action(key)
+        t1 = clock(); game.update_player_buffs()
+        t2 = clock(); game.update_monsters(); game.static_monster_attack()
+        t3 = clock(); game.update_bullets()
+        t4 = clock(); game.spawn_monsters_check(); game.process_spawn_warnings()
+        t5 = clock()
+        game.update_death_marks()
+        game.spawn_items_check()
+        game.compact_entities()
+        game.frame_count += 1
+
+        saved_stdout, sys.stdout = sys.stdout, sink
+        try:
+            t6 = clock(); main.print_map(game, renderer, camera); t7 = clock()
+        finally:
+            sys.stdout = saved_stdout
+
+        for phase, ns in zip(PHASES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t7 - t6)):
+            samples[phase].append(ns)
+    return samples, sink.chars / ticks
+
+
+def summarize(ns_samples):
+    s = sorted(ns_samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))] / 1000
+    mean = sum(s) / len(s)
+    return {
+        'ops_per_sec': round(1e9 / mean, 1) if mean else None,
+        'mean_us': round(mean / 1000, 2),
+        'p50_us': round(pick(0.50), 2),
+        'p90_us': round(pick(0.90), 2),
+        'p99_us': round(pick(0.99), 2),
+    }
+
+
+def run_all(game_cls, scenarios, maps, ticks, seed):
+    results = {}
+    for map_name in maps:
+        width, height = MAPS[map_name]
+        floor = (width - 2) * (height - 2)
+        for name in scenarios:
+            spec = SCENARIOS[name]
+            if spec['monsters'] + spec['bullets'] > floor * MAX_FILL:
+                continue
+            with map_settings(width, height, spec['density']):
+                samples, chars = run_scenario(game_cls, spec, ticks, seed)
+            for phase in PHASES:
+                results[f"{name}/{map_name}/{phase}"] = summarize(samples[phase])
+            results[f"{name}/{map_name}/print_map"]['chars_per_frame'] = round(chars, 1)
+            print(f"  done {name} on {map_name}", file=sys.stderr)
+    return results
+# ------------------------------------------------------------------------------
+
+
+
+# --- Reporting ----------------------------------------------------------------
+def print_table(results):
+    print(f"{'scenario/map/phase':<44}{'ops/s':>12}{'p50 us':>11}{'p90 us':>11}{'p99 us':>11}")
+    for key, r in results.items():
+        print(f"{key:<44}{r['ops_per_sec'] or 0:>12.0f}{r['p50_us']:>11.1f}{r['p90_us']:>11.1f}{r['p99_us']:>11.1f}")
+
+
+def compare(results, baseline, threshold):
+    """Print p50 ratios against a baseline; return the keys slower than threshold."""
+    regressions = []
+    print(f"{'scenario/map/phase':<44}{'base p50':>11}{'new p50':>11}{'change':>9}")
+    for key, r in results.items():
+        old = baseline.get(key)
+        if not old or not old['p50_us']:
+            continue
+        change = r['p50_us'] / old['p50_us'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f"{key:<44}{old['p50_us']:>11.1f}{r['p50_us']:>11.1f}{change:>+9.0%}{flag}")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Per-subsystem tick benchmarks")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="comma-separated scenario names")
+    parser.add_argument('--maps', default=','.join(MAPS), help="comma-separated map sizes")
+    parser.add_argument('--ticks', type=int, default=100, help="ticks timed per scenario")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--game', choices=('object', 'array'), default='object',
+                        help="monster store: plain objects or the NumPy arrays in horde.py")
+    parser.add_argument('--save', metavar='FILE', help="write results as a JSON baseline")
+    parser.add_argument('--compare', metavar='FILE', help="diff p50 times against a JSON baseline")
+    parser.add_argument('--threshold', type=float, default=0.15, help="p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    if args.game == 'array':
+        from horde import HordeGame as game_cls
+    else:
+        game_cls = main.Game
+
+    results = run_all(game_cls, args.scenarios.split(','), args.maps.split(','), args.ticks, args.seed)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+    else:
+        print_table(results)
+        regressions = []
+
+    if args.save:
+        meta = {'python': platform.python_version(), 'machine': platform.machine(),
+                'game': args.game, 'ticks': args.ticks, 'seed': args.seed,
+                'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+        with open(args.save, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=1)
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+# ------------------------------------------------------------------------------
+
+if __name__ == '__main__': main_cli()
@@ -0,0 +1,439 @@
+'''
+ARRAY-BACKED MONSTER STORE
+HordeGame is a drop-in Game whose monsters live in NumPy columns, so every
+monster rule in a tick runs as one batched operation instead of a Python
+branch per monster. Meant for headless simulations of 10k+ monsters.
+Needs `pip install numpy`.
+'''
+
+import main
+from main import Game, make_bullet_towards, MONSTER_CAP
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("The array monster store needs NumPy. Please install it with `pip install numpy`.") from e
+
+
+
+# --- Monster Columns ----------------------------------------------------------
+NO_VALUE = -1   # stands in for None in the integer columns
+
+COLUMNS = ('row', 'col', 'type', 'hp', 'age', 'lifespan', 'frame_since_action',
+           'target_row', 'target_col', 'bullet_timer')
+NULLABLE = {'target_row', 'target_col', 'bullet_timer'}
+
+
+def _column(name):
+    nullable = name in NULLABLE
+    def fget(self):
+        v = int(getattr(self._store, name)[self.slot])
+        return None if nullable and v == NO_VALUE else v
+    def fset(self, v):
+        getattr(self._store, name)[self.slot] = NO_VALUE if v is None else v
+    return property(fget, fset)
+
+
+def _stat(key):
+    return property(lambda self: self._store.stats[self.type][key])
+
+
+class MonsterView:
+    """Monster-shaped handle onto one slot of a MonsterArrays store, so the
+    shared Game code (sword, bullets, rendering) works unchanged."""
+    __slots__ = ('_store', 'slot')
+
+    def __init__(self, store, slot):
+        self._store = store
+        self.slot = slot
+
+    char = _stat('char')
+    max_hp = _stat('max_hp')
+    atk = _stat('atk')
+    speed = _stat('speed')
+    score = _stat('score')
+
+for _name in COLUMNS:
+    setattr(MonsterView, _name, _column(_name))
+
+
+class MonsterArrays:
+    """Structure-of-arrays monster storage with a free list of slots and a
+    HEIGHT x WIDTH occupancy grid holding the slot at each cell (-1 if empty)."""
+
+    def __init__(self, stats, height, width, capacity=64):
+        self.stats = stats
+        for name in COLUMNS:
+            setattr(self, name, np.full(capacity, NO_VALUE, np.int32))
+        self.alive = np.zeros(capacity, bool)
+        self.views = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+        self.count = 0
+        self.occ = np.full((height, width), NO_VALUE, np.int32)
+
+    def _grow(self):
+        cap = len(self.alive)
+        for name in COLUMNS:
+            setattr(self, name, np.concatenate([getattr(self, name), np.full(cap, NO_VALUE, np.int32)]))
+        self.alive = np.concatenate([self.alive, np.zeros(cap, bool)])
+        self.views.extend([None] * cap)
+        self.free.extend(range(2 * cap - 1, cap - 1, -1))
+
+    def add(self, m):
+        """Copy a Monster object into a free slot and return its view."""
+        if not self.free:
+            self._grow()
+        slot = self.free.pop()
+        for name in COLUMNS:
+            v = getattr(m, name)
+            getattr(self, name)[slot] = NO_VALUE if v is None else v
+        self.alive[slot] = True
+        self.occ[m.row, m.col] = slot
+        view = self.views[slot] = MonsterView(self, slot)
+        self.count += 1
+        return view
+
+    def remove(self, slot):
+        if self.occ[self.row[slot], self.col[slot]] == slot:
+            self.occ[self.row[slot], self.col[slot]] = NO_VALUE
+        self.alive[slot] = False
+        self.views[slot] = None
+        self.free.append(slot)
+        self.count -= 1
+
+    def live_slots(self):
+        return np.flatnonzero(self.alive)
+
+    def load(self, records, slots, free, capacity):
+        """Replace the contents with `records` (one COLUMNS row per monster)
+        placed at `slots`, in a store of `capacity` slots whose free list is
+        `free`."""
+        self.__init__(self.stats, *self.occ.shape, capacity)
+        for j, name in enumerate(COLUMNS):
+            getattr(self, name)[slots] = records[:, j]
+        self.alive[slots] = True
+        self.free = list(free)
+        self.count = len(slots)
+        self.occ[self.row[slots], self.col[slots]] = slots
+        for slot in slots.tolist():
+            self.views[slot] = MonsterView(self, slot)
+
+
+class _MonsterList:
+    """Read-only sequence of live monster views, in slot order."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return self._store.count
+
+    def __iter__(self):
+        views = self._store.views
+        return iter([views[s] for s in self._store.live_slots()])
+
+    def compact(self):
+        pass    # freed slots are reused, there is nothing to squeeze out
+
+
+class _MonsterGrid:
+    """Mapping-like (r, c) -> view lookup backed by the occupancy grid."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def get(self, cell, default=None):
+        slot = self._store.occ[cell]
+        return default if slot == NO_VALUE else self._store.views[slot]
+
+    def __contains__(self, cell):
+        return self._store.occ[cell] != NO_VALUE
+
+    def __len__(self):
+        return self._store.count
+# ------------------------------------------------------------------------------
+
+
+
+# --- Horde Game ---------------------------------------------------------------
+class HordeGame(Game):
+    """Game with array-backed monsters and vectorized monster updates.
+
+    Movement conflicts are resolved in one pass instead of list order: a move
+    only succeeds into a cell that was free at the start of the tick, and when
+    several monsters claim the same cell the lowest slot wins. Losers behave
+    exactly as if the cell had been occupied (walkers drop their waypoint).
+    """
+
+    snapshot_flags = main.SNAPSHOT_ARRAY_MONSTERS
+
+    def __init__(self, monster_cap=MONSTER_CAP, seed=None, obstacles=None, fog=False):
+        super().__init__(monster_cap, seed, obstacles, fog)
+        self.np_rng = np.random.default_rng(self.seed)
+        self.store = MonsterArrays(main.monster_stats, main.HEIGHT, main.WIDTH)
+        self.monsters = _MonsterList(self.store)
+        self.monster_at = _MonsterGrid(self.store)
+
+        # Border cells and obstacles, for batched "can step here" checks
+        self._build_wall()
+
+        # The shared chaser flow field as a grid (-1 where it does not reach)
+        self.flow_grid = np.full((main.HEIGHT, main.WIDTH), NO_VALUE, np.int32)
+        self._flow_grid_key = None
+
+        # Per-type stats as lookup tables indexed by monster type
+        size = max(main.monster_stats) + 1
+        self.type_atk = np.zeros(size, np.int32)
+        self.type_speed = np.full(size, NO_VALUE, np.int32)
+        self.type_cooldown = np.zeros(size, np.int32)
+        for t, s in main.monster_stats.items():
+            self.type_atk[t] = s['atk']
+            self.type_speed[t] = NO_VALUE if s['speed'] is None else s['speed']
+            self.type_cooldown[t] = s.get('bullet_cooldown', 0)
+
+    def _build_wall(self):
+        self.wall = np.ones((main.HEIGHT, main.WIDTH), bool)
+        self.wall[1:-1, 1:-1] = False
+        for (r, c) in self.obstacle_set:
+            self.wall[r, c] = True
+        self.walkable_ids = np.flatnonzero(~self.wall.ravel())
+        self._wall_version = self.obstacle_version
+
+    def _refresh_flow_grid(self):
+        self.flow_field.update(self)
+        if self._flow_grid_key == self.flow_field.key: return
+        self._flow_grid_key = self.flow_field.key
+        dist = self.flow_field.dist
+        cells = np.fromiter(dist.keys(), np.int64, len(dist))
+        self.flow_grid.fill(NO_VALUE)
+        self.flow_grid.ravel()[cells] = np.fromiter(dist.values(), np.int32, len(dist))
+
+    def add_monster(self, m):
+        self._occupy(m.row, m.col)
+        return self.store.add(m)
+
+    def move_monster(self, m, nr, nc):
+        s = self.store
+        r, c = int(s.row[m.slot]), int(s.col[m.slot])
+        s.occ[r, c] = NO_VALUE
+        s.row[m.slot], s.col[m.slot] = nr, nc
+        s.occ[nr, nc] = m.slot
+        self._occupy(nr, nc)
+        self._vacate(r, c)
+
+    def remove_monster(self, m):
+        r, c = m.row, m.col
+        self.store.remove(m.slot)
+        self._vacate(r, c)
+
+    # Snapshot hooks: monsters are saved as their columns, and the NumPy
+    # generator's state goes with the Mersenne Twister's
+    def _monster_snapshot(self):
+        s = self.store
+        live = s.live_slots()
+        records = np.stack([getattr(s, name)[live] for name in COLUMNS], axis=1)
+        return (records.astype(np.int32).tobytes(), live.astype(np.int32).tobytes(),
+                np.array(s.free, np.int32).tobytes(), len(s.alive))
+
+    def _restore_monsters(self, records, order, free, capacity, exact):
+        records = np.frombuffer(records, np.int32).reshape(-1, len(COLUMNS))
+        n = len(records)
+        if exact:
+            slots = np.frombuffer(order, np.int32).astype(np.intp)
+            free = np.frombuffer(free, np.int32).tolist()
+        else:
+            capacity = max(64, n)
+            slots = np.arange(n)
+            free = range(capacity - 1, n - 1, -1)
+        self.store.load(records, slots, free, capacity)
+        return None     # no per-monster timers to restore
+
+    def _rng_snapshot(self):
+        fields = super()._rng_snapshot()[:627]
+        state = self.np_rng.bit_generator.state
+        return (*fields, state['state']['state'].to_bytes(16, 'little'),
+                state['state']['inc'].to_bytes(16, 'little'), state['has_uint32'], state['uinteger'])
+
+    def _restore_rng(self, fields):
+        super()._restore_rng(fields)
+        state, inc, has_uint32, uinteger = fields[627:]
+        if not any(inc):
+            return      # written by a plain Game: keep the generator seeded from `seed`
+        self.np_rng.bit_generator.state = {
+            'bit_generator': 'PCG64',
+            'state': {'state': int.from_bytes(state, 'little'), 'inc': int.from_bytes(inc, 'little')},
+            'has_uint32': has_uint32, 'uinteger': uinteger}
+
+    def _hurt_player_by(self, types):
+        """hurt_player() once per monster type, for monsters of these types."""
+        counts = np.bincount(types)
+        for t in np.flatnonzero(counts):
+            self.hurt_player(int(counts[t] * self.type_atk[t]), int(t))
+
+    def _kill_slots(self, slots):
+        for slot in slots:
+            view = self.store.views[slot]
+            if view is not None:
+                self.kill_monster(view)
+
+    def _pick_targets(self, slots):
+        """Vectorized random_walkable_cell(): uniform over the non-wall cells."""
+        if not len(slots): return
+        s = self.store
+        ids = self.walkable_ids[self.np_rng.integers(0, len(self.walkable_ids), len(slots))]
+        s.target_row[slots], s.target_col[slots] = np.divmod(ids, main.WIDTH)
+
+    def update_monsters(self):
+        """Update monsters: lifespan, optional shooting, movement, and collisions."""
+        s, player = self.store, self.player
+        if self._wall_version != self.obstacle_version:
+            self._build_wall()
+
+        # Lifespan
+        live = s.live_slots()
+        s.age[live] += 1
+        self._kill_slots(live[s.age[live] >= s.lifespan[live]])
+
+        # Skeleton shots
+        live = s.live_slots()
+        shooters = live[s.bullet_timer[live] != NO_VALUE]
+        s.bullet_timer[shooters] -= 1
+        firing = shooters[s.bullet_timer[shooters] <= 0]
+        if self.fov and len(firing):
+            rows, cols = s.row[firing], s.col[firing]
+            gap = np.maximum(np.abs(rows - player.row), np.abs(cols - player.col)) - self.fov.radius
+            sight = gap <= 0                        # past the radius is out of view without the cast
+            if sight.any():
+                visible = self.fov.update(self)
+                sight[sight] = [cell in visible for cell in zip(rows[sight].tolist(), cols[sight].tolist())]
+            # no line of sight: look again once the player could be in view (FieldOfView.hidden_for)
+            s.bullet_timer[firing[~sight]] = np.maximum(1, (gap[~sight] + 1) // 2)
+            firing = firing[sight]
+        for slot in firing:
+            r, c, t = int(s.row[slot]), int(s.col[slot]), int(s.type[slot])
+            self.add_bullet(make_bullet_towards(r, c, player.row, player.col, int(self.type_atk[t]), False,
+                                                self.bullet_pool))
+        s.bullet_timer[firing] = self.type_cooldown[s.type[firing]]
+
+        # Speed gating
+        speed = self.type_speed[s.type[live]]
+        gated = live[speed != NO_VALUE]
+        speed = speed[speed != NO_VALUE]
+        s.frame_since_action[gated] += 1
+        due = s.frame_since_action[gated] >= speed
+        acting = gated[due]
+        s.frame_since_action[acting] = 0
+        if not len(acting): return
+
+        types = s.type[acting]
+        rows, cols = s.row[acting], s.col[acting]
+        walker = (types == 2) | (types == 4)
+        chaser = types == 3
+
+        # Random waypoint walkers: pick a new waypoint when missing or reached
+        need = walker & ((s.target_row[acting] == NO_VALUE)
+                         | ((rows == s.target_row[acting]) & (cols == s.target_col[acting])))
+        self._pick_targets(acting[need])
+        has_target = s.target_row[acting] != NO_VALUE
+        walker &= has_target
+        tr, tc = s.target_row[acting], s.target_col[acting]
+        dr = np.where(walker, np.sign(tr - rows), 0)
+        dc = np.where(walker, np.sign(tc - cols), 0)
+        diag = walker & (dr != 0) & (dc != 0)
+        coin = self.np_rng.random(len(acting)) < 0.5
+        dc[diag & coin] = 0
+        dr[diag & ~coin] = 0
+
+        # Chasers beyond the flow field: greedy step toward the player, one axis;
+        # sidestep when blocked
+        pdr, pdc = np.sign(player.row - rows), np.sign(player.col - cols)
+        dr = np.where(chaser, pdr, dr)
+        dc = np.where(chaser, np.where(pdr != 0, 0, pdc), dc)
+        nr, nc = rows + dr, cols + dc
+        chaser_blocked = chaser & self.wall[nr, nc]
+        sidestep = chaser_blocked & (dr != 0)
+        nr = np.where(chaser_blocked, rows, nr)
+        nc = np.where(chaser_blocked, cols, nc)
+        nc[sidestep] = cols[sidestep] + pdc[sidestep]
+
+        # Chasers inside the flow field: first free neighbor one step closer,
+        # in FlowField.next_cell's preference order; stay put if none is free
+        if chaser.any():
+            self._refresh_flow_grid()
+            flow = self.flow_grid
+            d = flow[rows, cols]
+            in_field = chaser & (d != NO_VALUE)
+            sy = np.where(player.row > rows, 1, -1)
+            sx = np.where(player.col > cols, 1, -1)
+            fr, fc = rows.copy(), cols.copy()
+            chosen = np.zeros(len(acting), bool)
+            for ddr, ddc in ((sy, 0), (0, sx), (-sy, 0), (0, -sx)):
+                cr, cc = rows + ddr, cols + ddc
+                ok = in_field & ~chosen & (flow[cr, cc] == d - 1) & (s.occ[cr, cc] == NO_VALUE)
+                fr[ok], fc[ok] = cr[ok], cc[ok]
+                chosen |= ok
+            nr = np.where(in_field, fr, nr)
+            nc = np.where(in_field, fc, nc)
+
+        moving = (walker | chaser) & ((nr != rows) | (nc != cols))
+        walled = moving & walker & self.wall[nr, nc]
+        occupied = moving & ~walled & (s.occ[nr, nc] != NO_VALUE)
+        hits_player = moving & ~walled & ~occupied & (nr == player.row) & (nc == player.col)
+        claims = moving & ~walled & ~occupied & ~hits_player
+
+        # One winner per claimed cell: the lowest slot (acting is sorted by slot)
+        idx = np.flatnonzero(claims)
+        cell_ids = nr[idx] * main.WIDTH + nc[idx]
+        _, first = np.unique(cell_ids, return_index=True)
+        winners = np.zeros(len(acting), bool)
+        winners[idx[first]] = True
+        lost = claims & ~winners
+
+        # Walkers that could not step drop their waypoint (as do Skeletons that hit the player)
+        reset = acting[walker & (walled | occupied | lost | (hits_player & (types == 4)))]
+        s.target_row[reset] = NO_VALUE
+        s.target_col[reset] = NO_VALUE
+
+        movers = acting[winners]
+        old_rows, old_cols = s.row[movers], s.col[movers]
+        s.occ[old_rows, old_cols] = NO_VALUE
+        s.row[movers] = nr[winners]
+        s.col[movers] = nc[winners]
+        s.occ[s.row[movers], s.col[movers]] = movers
+        for i in (nr[winners] * main.WIDTH + nc[winners]).tolist():
+            self.free_cells.discard(i)
+        for r, c in zip(old_rows.tolist(), old_cols.tolist()):
+            self._vacate(r, c)
+
+        if hits_player.any():
+            self._hurt_player_by(types[hits_player])
+            self._kill_slots(acting[hits_player & (types != 4)])
+
+    def static_monster_attack(self):
+        """Type-1 static monster triggers when player is adjacent, then disappears."""
+        s, player = self.store, self.player
+        live = s.live_slots()
+        dr = np.abs(s.row[live] - player.row)
+        dc = np.abs(s.col[live] - player.col)
+        triggered = live[(s.type[live] == 1) & (dr <= 1) & (dc <= 1) & ((dr + dc) > 0)]
+        if not len(triggered): return
+        self._hurt_player_by(s.type[triggered])
+        self._kill_slots(triggered)
+
+    def nearest_monsters(self, r, c, k=1, radius=None):
+        """Up to k monsters closest to (r, c) by Manhattan distance, nearest first,
+        optionally only those within `radius` (ties go to the lower slot)."""
+        s = self.store
+        live = s.live_slots()
+        d = np.abs(s.row[live] - r) + np.abs(s.col[live] - c)
+        if radius is not None:
+            keep = d <= radius
+            live, d = live[keep], d[keep]
+        if len(live) > k:
+            # Keep everything tied with the k-th distance so the slot tie-break holds
+            kth = np.partition(d, k - 1)[k - 1]
+            keep = d <= kth
+            live, d = live[keep], d[keep]
+        order = np.lexsort((live, d))[:k]
+        return [s.views[slot] for slot in live[order]]
+# ------------------------------------------------------------------------------
@@ -1,24 +1,57 @@
 '''
 MOUSE KNIGHT'S SURVIVAL ADVENTURE
 Run this script to start
-Might need `pip install keyboard` to run for MAC or Linux
+On MAC or Linux keys are read straight from the terminal; `pip install keyboard`
+is only needed when stdin is not a terminal
 '''
 
+import time
+STARTUP_T0 = time.perf_counter()    # the startup report counts from here
+
+import io
 import os
+import re
 import sys
-import time
+import queue
+import bisect
 import random
-
+import shutil
+import struct
+import threading
+import zlib
+import mmap
+from array import array
+from collections import deque
+from itertools import accumulate, compress
+from operator import itemgetter
+
+have_termios = False
 try:
     import msvcrt
     have_msvcrt = True
 except ImportError:
     have_msvcrt = False
     try:
-        import keyboard
+        import select, termios, tty
+        have_termios = True
     except ImportError:
-        print("keyboard library not found. Please install it with `pip install keyboard`.")
-        sys.exit(1)
+        pass
+
+# The keyboard library is only needed when stdin is not a terminal we can read
+# directly, so main() imports it then (load_keyboard) and nothing else pays for it
+keyboard = None
+
+
+def load_keyboard():
+    """Import the keyboard library on first use; return it, or None if it is missing."""
+    global keyboard
+    if keyboard is None:
+        try:
+            import keyboard as module
+        except ImportError:
+            return None
+        keyboard = module
+    return keyboard
 
 
 
@@ -28,11 +61,17 @@ RESET = "\033[0m"
 BRIGHT_YELLOW = "\033[93m"
 BRIGHT_RED = "\033[91m"
 BRIGHT_GREEN = "\033[92m"
-try:
-    from colorama import just_fix_windows_console
-    just_fix_windows_console()
-except Exception:
-    pass
+
+def enable_ansi():
+    """Have the Windows console interpret ANSI codes (through colorama, when
+    installed). main() calls this before drawing anything; other terminals
+    need nothing, so colorama is never imported there."""
+    if os.name != 'nt': return
+    try:
+        from colorama import just_fix_windows_console
+        just_fix_windows_console()
+    except Exception:
+        pass
 
 def colorize_char(ch: str) -> str:
     """Return colored character according to entity type; fallback to plain if unsupported."""
@@ -60,6 +99,12 @@ ERASE_DOWN     = "\x1b[J"   # clear from cursor to end of screen
 def goto(row: int, col: int = 1) -> str:
     """ANSI absolute cursor addressing (1-based)."""
     return f"\x1b[{row};{col}H"
+
+# The same as bytes, for the frame painter (GOTO_CODE % (row, col))
+GOTO_CODE = b"\x1b[%d;%dH"
+CURSOR_HOME_CODE = CURSOR_HOME.encode()
+ERASE_LINE_CODE = ERASE_LINE.encode()
+ERASE_DOWN_CODE = ERASE_DOWN.encode()
 # ------------------------------------------------------------------------------
 
 
@@ -70,6 +115,17 @@ HEIGHT = 20
 OBSTACLE_DENSITY = 0.02
 FRAME_INTERVAL_SEC = 0.012
 
+# lines above the map (HP/score line and status line)
+HEADER_LINES = 2
+
+# fixed-timestep limits: ticks run per loop when catching up, queued keys kept
+MAX_CATCHUP_TICKS = 5
+INPUT_QUEUE_LIMIT = 4
+
+# paint frames on a render thread so terminal writes never delay the tick
+# (--sync-render paints on the tick thread instead)
+RENDER_THREAD = True
+
 # player initial attributes
 PLAYER_MAX_HP = 100
 PLAYER_ATTACK = 10
@@ -78,6 +134,19 @@ PLAYER_WEAPON_LENGTH = 3
 # magic auto-shoot
 MAGIC_SHOOT_INTERVAL = 50
 
+# chaser pathfinding: how many steps from the player the shared flow field reaches
+FLOW_FIELD_RADIUS = 40
+
+# fog of war: how far the player sees (Euclidean, in cells), and how many recent
+# player cells keep their computed view
+FOV_RADIUS = 12
+FOV_CACHE_SIZE = 32
+
+# nearest-monster queries: bucket edge in cells, and the population below which
+# a plain scan is cheaper than the bucket search
+NEAREST_BUCKET_SIZE = 8
+LINEAR_SCAN_LIMIT = 32
+
 # bullet pacing
 BULLET_STEP_FRAMES = 8
 
@@ -90,6 +159,17 @@ ITEM_CAP = 4
 
 # item spawn interval (frames)
 ITEM_SPAWN_INTERVAL_FRAMES = 600
+
+# most released bullets kept for reuse
+BULLET_POOL_LIMIT = 4096
+
+# timer wheel levels as powers of two: 256 one-tick slots, then 64 slots per level
+TIMER_WHEEL_BITS = (8, 6, 6, 6)
+
+# session casts: frames waiting for the writer thread before new ones are
+# dropped, and seconds per compressed block (each starts with a full frame)
+CAST_QUEUE_FRAMES = 120
+CAST_BLOCK_SECONDS = 2.0
 # ------------------------------------------------------------------------------
 
 
@@ -107,9 +187,124 @@ ITEM_CHAR_SET = {'H', 'S', 'M', 'D'}
 
 
 
+# --- Timers -------------------------------------------------------------------
+class TickClock:
+    """The current tick, shared by a game and the entities whose countdowns
+    are stored as deadlines against it."""
+    __slots__ = ('now',)
+
+    def __init__(self, now=0):
+        self.now = now
+
+
+class TimerWheel:
+    """Hierarchical timing wheel of one-shot callbacks keyed by (tick, phase).
+
+    Level 0 has one slot per tick for the current 256-tick span; each level
+    above has 64 slots, one per span of the level below, and a slot is cascaded
+    down when its span begins. Scheduling is O(1) and a tick only touches the
+    timers that fire in it. fire(tick, phase) runs what is due for that phase,
+    so each countdown still expires at the point of the tick that used to
+    decrement it.
+    """
+
+    def __init__(self, now=0):
+        self.now = now
+        self.layout = []       # (shift, bits) per level
+        shift = 0
+        for bits in TIMER_WHEEL_BITS:
+            self.layout.append((shift, bits))
+            shift += bits
+        self.span_bits = shift
+        self.levels = [[[] for _ in range(1 << bits)] for bits in TIMER_WHEEL_BITS]
+        self.overflow = []     # past the top level's span
+        self.due = {}          # phase -> entries due at or before self.now
+
+    def schedule(self, tick, phase, fn, *args):
+        """Call fn(*args) when `phase` fires at `tick` (or its next firing, if late)."""
+        self._insert((tick, phase, fn, args))
+
+    def take(self, tick, phase):
+        """Remove and return the entries due by `tick` for `phase` without running
+        them, for callers that need them in some other order."""
+        if tick > self.now:
+            self._advance(tick)
+        return self.due.pop(phase, [])
+
+    def fire(self, tick, phase):
+        """Run the callbacks due by `tick` for `phase`, including any they add."""
+        if tick > self.now:
+            self._advance(tick)
+        due = self.due
+        while phase in due:
+            for _, _, fn, args in due.pop(phase):
+                fn(*args)
+
+    def _insert(self, entry):
+        tick, now = entry[0], self.now
+        if tick <= now:
+            self.due.setdefault(entry[1], []).append(entry)
+            return
+        for level, (shift, bits) in enumerate(self.layout):
+            if tick >> (shift + bits) == now >> (shift + bits):
+                self.levels[level][(tick >> shift) & ((1 << bits) - 1)].append(entry)
+                return
+        self.overflow.append(entry)
+
+    def _cascade(self, entries):
+        pending = entries[:]
+        entries.clear()
+        for entry in pending:
+            self._insert(entry)
+
+    def _advance(self, tick):
+        levels, layout = self.levels, self.layout
+        mask0 = (1 << layout[0][1]) - 1
+        while self.now < tick:
+            self.now = t = self.now + 1
+            if not t & mask0:
+                # A new level-0 span: pull higher levels down, top first
+                if not t & ((1 << self.span_bits) - 1):
+                    self._cascade(self.overflow)
+                for level in range(len(layout) - 1, 0, -1):
+                    shift, bits = layout[level]
+                    if not t & ((1 << shift) - 1):
+                        self._cascade(levels[level][(t >> shift) & ((1 << bits) - 1)])
+            slot = levels[0][t & mask0]
+            if slot:
+                for entry in slot:
+                    self.due.setdefault(entry[1], []).append(entry)
+                slot.clear()
+# ------------------------------------------------------------------------------
+
+
+
 # --- Entity Classes -----------------------------------------------------------
+def _countdown(deadline, lead=0):
+    """A countdown attribute stored as a deadline tick on self.clock. With
+    lead=1 the deadline is one tick sooner, for buffs that used to be counted
+    down in the buffs phase of the very tick they were set in."""
+    def fget(self):
+        return max(0, getattr(self, deadline) - self.clock.now)
+    def fset(self, ticks):
+        setattr(self, deadline, self.clock.now + ticks - lead)
+    return property(fget, fset)
+
+
 class Player:
-    def __init__(self, row, col):
+    """Buff timers are deadlines on the game clock; strength_timer and friends
+    read and set them as ticks remaining."""
+    __slots__ = ('row', 'col', 'max_hp', 'hp', 'base_attack', 'attack', 'length', 'clock',
+                 'strength_until', 'magic_until', 'shield_until', 'magic_ready')
+
+    # A pickup's timer = N lasts N - 1 ticks including the pickup tick, as
+    # when the buffs phase decremented it before anything read it
+    strength_timer = _countdown('strength_until', lead=1)
+    magic_timer = _countdown('magic_until', lead=1)
+    shield_timer = _countdown('shield_until', lead=1)
+    magic_cooldown = _countdown('magic_ready')
+
+    def __init__(self, row, col, clock=None):
         self.row = row
         self.col = col
         self.max_hp = PLAYER_MAX_HP
@@ -117,6 +312,7 @@ class Player:
         self.base_attack = PLAYER_ATTACK
         self.attack = PLAYER_ATTACK
         self.length = PLAYER_WEAPON_LENGTH
+        self.clock = clock if clock is not None else TickClock()
         self.strength_timer = 0
         self.magic_timer = 0
         self.shield_timer = 0
@@ -134,28 +330,65 @@ class Player:
         self.col = WIDTH // 2
 
 
+def _stat(key):
+    return property(lambda self: self.stats[key])
+
+
 class Monster:
+    """Per-type stats (char, max_hp, atk, speed, score) are read through the
+    shared monster_stats entry rather than copied onto every monster.
+    Once added to a game its countdowns are deadlines on the game clock
+    (born, next_action, next_shot); age, frame_since_action and bullet_timer
+    are derived from them."""
+    __slots__ = ('type', 'stats', 'hp', 'row', 'col', 'target_row', 'target_col',
+                 'lifespan', 'clock', 'born', 'next_action', 'next_shot')
+
+    char = _stat('char')
+    max_hp = _stat('max_hp')
+    atk = _stat('atk')
+    speed = _stat('speed')
+    score = _stat('score')
+
     def __init__(self, mtype, row, col):
         s = monster_stats[mtype]
         self.type = mtype
-        self.char = s['char']
-        self.max_hp = s['max_hp']
-        self.hp = self.max_hp
-        self.atk = s['atk']
-        self.speed = s['speed']
-        self.score = s['score']
+        self.stats = s
+        self.hp = s['max_hp']
         self.row = row
         self.col = col
-        self.frame_since_action = 0
         self.target_row = None
         self.target_col = None
-        self.bullet_timer = s['bullet_cooldown'] if mtype == 4 else None
         self.lifespan = 2000
-        self.age = 0
+        self.clock = None       # set while the monster is in a game
+        self.born = self.next_action = self.next_shot = None
+
+    @property
+    def age(self):
+        return 0 if self.clock is None else self.clock.now - self.born
+
+    @property
+    def frame_since_action(self):
+        if self.next_action is None: return 0
+        return max(1, self.speed) - (self.next_action - self.clock.now)
+
+    @property
+    def bullet_timer(self):
+        if self.type != 4: return None
+        if self.next_shot is None: return self.stats['bullet_cooldown']
+        return self.next_shot - self.clock.now
 
 
 class Bullet:
+    """`gen` changes every time the bullet is removed, so timers scheduled for
+    an earlier use of a pooled bullet can tell they are stale."""
+    __slots__ = ('row', 'col', 'dr', 'dc', 'damage', 'from_player', 'dx', 'dy',
+                 'sx', 'sy', 'err', 'has_target', 'next_move', 'gen')
+
     def __init__(self, row, col, dr, dc, damage, from_player):
+        self.gen = 0
+        self.reset(row, col, dr, dc, damage, from_player)
+
+    def reset(self, row, col, dr, dc, damage, from_player):
         self.row = row
         self.col = col
         self.dr = dr
@@ -168,24 +401,87 @@ class Bullet:
         self.sy = 0
         self.err = 0
         self.has_target = False
-        self.move_counter = 0
+        self.next_move = None
+
+
+class BulletPool:
+    """Free list of spent bullets; acquire() reuses one before allocating."""
+
+    def __init__(self, limit=BULLET_POOL_LIMIT):
+        self.limit = limit
+        self.free = []
+
+    def acquire(self, row, col, dr, dc, damage, from_player):
+        if self.free:
+            b = self.free.pop()
+            b.reset(row, col, dr, dc, damage, from_player)
+            return b
+        return Bullet(row, col, dr, dc, damage, from_player)
+
+    def release(self, b):
+        if len(self.free) < self.limit:
+            self.free.append(b)
 
 
 class Item:
+    __slots__ = ('type', 'row', 'col', 'char')
+
     def __init__(self, itype, row, col):
         self.type = itype
         self.row = row
         self.col = col
         self.char = itype if itype in ITEM_CHAR_SET else '?'
+
+
+class EntityList:
+    """Insertion-ordered entity container with O(1) removal.
+
+    remove() only blanks the entity's slot; iteration skips blanks, so it is
+    safe to remove while iterating, and compact() squeezes them out in one
+    pass (the game does so at the end of each tick). Entities are keyed by
+    id(), so plain dicts such as death marks work too. Every entity must be
+    truthy, which objects and non-empty dicts are.
+    """
+    __slots__ = ('slots', 'index', 'holes')
+
+    def __init__(self, entities=()):
+        self.slots = []
+        self.index = {}     # id(entity) -> position in slots
+        self.holes = 0
+        for e in entities:
+            self.append(e)
+
+    def append(self, e):
+        self.index[id(e)] = len(self.slots)
+        self.slots.append(e)
+
+    def remove(self, e):
+        self.slots[self.index.pop(id(e))] = None
+        self.holes += 1
+
+    def compact(self):
+        if not self.holes: return
+        self.slots = [e for e in self.slots if e is not None]
+        self.index = {id(e): i for i, e in enumerate(self.slots)}
+        self.holes = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return filter(None, self.slots)
+
+    def __contains__(self, e):
+        return id(e) in self.index
 # ------------------------------------------------------------------------------
 
 
 
 # --- Adjective Functions ------------------------------------------------------
-def random_location():
+def random_location(rng=random):
     """Generate a random (r, c) in the map."""
-    r = random.randint(1, HEIGHT - 2)
-    c = random.randint(1, WIDTH - 2)
+    r = rng.randint(1, HEIGHT - 2)
+    c = rng.randint(1, WIDTH - 2)
     return r, c
 
 
@@ -193,31 +489,11 @@ def is_location_valid(r, c):
     return 0 < r < HEIGHT-1 and 0 < c < WIDTH-1
 
 
-def is_location_empty(r, c):
-    if not is_location_valid (r, c): return False
-    if (r, c) == (player.row, player.col): return False
-    if (r, c) in obstacle_set: return False
-    if any((r, c) == (m.row, m.col) for m in monsters): return False
-    if any((r, c) == (it.row, it.col) for it in items): return False
-    if any((r, c) == (w['row'], w['col']) for w in spawn_warnings): return False
-    return True
-
-
-def set_grid(grid, row, col, ch):
-    if is_location_valid(row, col):
-        grid[row][col] = ch
-
-
-def update_death_marks():
-    """Tick death mark timers and remove expired ones."""
-    for dm in death_marks[:]:
-        dm['timer'] -= 1
-        if dm['timer'] <= 0:
-            death_marks.remove(dm)
-
 def wait_any_key_blocking():
     """Block until any key is pressed (no echo)."""
-    if have_msvcrt:
+    if key_reader is not None:
+        _ = key_reader.wait_key()
+    elif have_msvcrt:
         _ = msvcrt.getch()
     else:
         _ = keyboard.read_key()
@@ -225,7 +501,9 @@ def wait_any_key_blocking():
 
 def _flush_pending_keys():
     """Flush leftover keypress after pause/countdown to avoid immediate re-trigger."""
-    if have_msvcrt:
+    if key_reader is not None:
+        key_reader.drain()
+    elif have_msvcrt:
         while msvcrt.kbhit():
             try:
                 _ = msvcrt.getch()
@@ -241,27 +519,1220 @@ def _flush_pending_keys():
         pause_key_down = False
 
 
-def monster_should_act(mon):
-    """Return True if monster should take an action this frame (speed gating)."""
-    if mon.speed is None or mon.speed == -1:
-        return False
-    mon.frame_since_action += 1
-    if mon.frame_since_action >= mon.speed:
-        mon.frame_since_action = 0
+def make_bullet_towards(sr, sc, tr, tc, damage, from_player, pool=None):
+    """Create a bullet that steps toward target using Bresenham-like deltas."""
+    if pool is not None:
+        b = pool.acquire(sr, sc, 0, 0, damage, from_player)
+    else:
+        b = Bullet(sr, sc, 0, 0, damage, from_player)
+    dx = abs(tc - sc); dy = abs(tr - sr)
+    b.sx = 1 if tc > sc else (-1 if tc < sc else 0)
+    b.sy = 1 if tr > sr else (-1 if tr < sr else 0)
+    b.dx = dx; b.dy = dy
+    b.err = (dx - dy)
+    b.has_target = True
+    return b
+# ------------------------------------------------------------------------------
+
+
+
+# --- Pathfinding --------------------------------------------------------------
+class FlowField:
+    """Walking distance to the player over the obstacle grid, shared by every
+    chaser. Built by BFS out to FLOW_FIELD_RADIUS steps and rebuilt only when the
+    player cell or the game's obstacle_version changes; chasers then need just a
+    few dict lookups to pick their next step. Cells are flat indices r * WIDTH + c.
+
+    A move is a full rebuild, not an incremental update: the grid is bipartite,
+    so a one-cell move changes every distance in the field by exactly one, up or
+    down, and any update would rewrite the whole field anyway. At radius 40 a
+    rebuild is about 1.6 ms, paid at most once per tick and only when a chaser
+    acts after the player has moved.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.dist = {}
+        self.width = WIDTH
+        self._walkable = None
+        self._walkable_version = None
+
+    def _build_walkable(self, game):
+        """bytearray over the map: 1 for floor, 0 for border and obstacles."""
+        w, h = WIDTH, HEIGHT
+        walkable = bytearray(b'\x01') * (w * h)
+        walkable[:w] = bytes(w)
+        walkable[-w:] = bytes(w)
+        for r in range(h):
+            walkable[r * w] = walkable[r * w + w - 1] = 0
+        for (r, c) in game.obstacle_set:
+            walkable[r * w + c] = 0
+        self._walkable = walkable
+        self._walkable_version = (game.obstacle_version, w, h)
+
+    def update(self, game):
+        key = (game.player.row, game.player.col, game.obstacle_version)
+        if key == self.key: return
+        self.key = key
+        if self._walkable_version != (game.obstacle_version, WIDTH, HEIGHT):
+            self._build_walkable(game)
+        w = self.width = WIDTH
+        unseen = bytearray(self._walkable)      # cleared as cells are reached
+        start = game.player.row * w + game.player.col
+        unseen[start] = 0
+        dist = {start: 0}
+        frontier = [start]
+        for d in range(1, FLOW_FIELD_RADIUS + 1):
+            reached = []
+            add = reached.append
+            for i in frontier:
+                for j in (i - w, i + w, i - 1, i + 1):
+                    if unseen[j]:
+                        unseen[j] = 0
+                        add(j)
+            if not reached: break
+            dist.update(dict.fromkeys(reached, d))
+            frontier = reached
+        self.dist = dist
+
+    def next_cell(self, r, c, pr, pc, blocked):
+        """Neighbor of (r, c) one step closer to the player and not in `blocked`,
+        (r, c) itself when every such step is taken, or None outside the field.
+        Vertical steps toward the player are preferred, like the greedy chaser."""
+        w = self.width
+        d = self.dist.get(r * w + c)
+        if d is None: return None
+        sy = 1 if pr > r else -1
+        sx = 1 if pc > c else -1
+        for dr, dc in ((sy, 0), (0, sx), (-sy, 0), (0, -sx)):
+            cell = (r + dr, c + dc)
+            if self.dist.get(cell[0] * w + cell[1]) == d - 1 and cell not in blocked:
+                return cell
+        return (r, c)
+# ------------------------------------------------------------------------------
+
+
+
+# --- Field of View ------------------------------------------------------------
+# (xx, xy, yx, yy) transforms from octant coordinates to map offsets
+_OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+# byte map values: sight passes, sight stops (wall or obstacle), off the map
+_SIGHT_CLEAR, _SIGHT_BLOCKED, _SIGHT_OFF_MAP = 1, 0, 2
+
+
+def _octant_rows(radius, width):
+    """Per octant, the scan rows 1..radius as tuples of cells (l_slope, r_slope,
+    dr, dc, offset, lit) from the left edge in: the slopes the cast compares,
+    the map offset from the player as (dr, dc) and as an index into the padded
+    byte map `width` wide, and whether the cell is inside the radius."""
+    r2 = radius * radius + radius       # rounder edge than radius ** 2
+    tables = []
+    for xx, xy, yx, yy in _OCTANTS:
+        rows = [()]
+        for j in range(1, radius + 1):
+            dy = -j
+            cells = []
+            for dx in range(-j, 1):
+                dr, dc = dx * yx + dy * yy, dx * xx + dy * xy
+                cells.append(((dx - 0.5) / (dy + 0.5), (dx + 0.5) / (dy - 0.5),
+                              dr, dc, dr * width + dc, dx * dx + dy * dy <= r2))
+            rows.append(tuple(cells))
+        tables.append(rows)
+    return tables
+
+
+class FieldOfView:
+    """Cells the player can see in fog-of-war mode: recursive shadowcasting
+    out to `radius` over the obstacles (the border blocks sight too). Like
+    FlowField it is recomputed only when the player cell or the game's
+    obstacle_version changes, and the last FOV_CACHE_SIZE results are kept so
+    stepping back onto a recent cell costs nothing. `visible` is a set of
+    (r, c); the obstacles that cast the shadows are visible themselves.
+
+    The cast reads a byte map padded by `radius` on every side, so no cell it
+    reaches needs a bounds check, and takes its slopes and offsets from
+    per-octant tables built with the map.
+    """
+
+    def __init__(self, radius=FOV_RADIUS):
+        self.radius = radius
+        self.key = None
+        self.visible = set()
+        self._recent = {}
+        self._sight = None          # padded bytearray of _SIGHT_* values
+        self._sight_version = None
+        self._rows = None           # _octant_rows for the padded width
+        self._window = None
+        self._window_key = None
+
+    def update(self, game):
+        key = (game.player.row, game.player.col, game.obstacle_version)
+        if key == self.key: return self.visible
+        self.key = key
+        visible = self._recent.get(key)
+        if visible is None:
+            if self._sight_version != (game.obstacle_version, WIDTH, HEIGHT):
+                self._build_sight(game)
+            r0, c0 = game.player.row, game.player.col
+            visible = {(r0, c0)}
+            origin = (r0 + self.radius) * self._width + c0 + self.radius
+            for rows in self._rows:
+                self._cast(visible, r0, c0, origin, 1, 1.0, 0.0, rows)
+            if len(self._recent) >= FOV_CACHE_SIZE:
+                del self._recent[next(iter(self._recent))]
+            self._recent[key] = visible
+        self.visible = visible
+        return visible
+
+    def _build_sight(self, game):
+        pad = self.radius
+        width = self._width = WIDTH + 2 * pad
+        sight = bytearray([_SIGHT_OFF_MAP]) * (width * (HEIGHT + 2 * pad))
+        edge = bytes([_SIGHT_BLOCKED]) * WIDTH
+        inner = bytes([_SIGHT_BLOCKED]) + bytes([_SIGHT_CLEAR]) * (WIDTH - 2) + bytes([_SIGHT_BLOCKED])
+        for r in range(HEIGHT):
+            i = (r + pad) * width + pad
+            sight[i:i + WIDTH] = edge if r in (0, HEIGHT - 1) else inner
+        for (r, c) in game.obstacle_set:
+            sight[(r + pad) * width + c + pad] = _SIGHT_BLOCKED
+        if self._rows is None or self._sight_version[1] != WIDTH:
+            self._rows = _octant_rows(self.radius, width)
+        self._sight, self._sight_version = sight, (game.obstacle_version, WIDTH, HEIGHT)
+        self._recent.clear()
+
+    def _cast(self, visible, r0, c0, origin, row, start, end, rows):
+        """Scan the octant's rows from `row` out, between slopes start and end,
+        recursing past each run of blocking cells with the narrowed slopes."""
+        if start < end: return
+        radius, sight, add = self.radius, self._sight, visible.add
+        new_start = start
+        for j in range(row, radius + 1):
+            blocked = False
+            for l_slope, r_slope, dr, dc, offset, lit in rows[j]:
+                if start < r_slope: continue
+                if end > l_slope: break
+                cell = sight[origin + offset]
+                if lit and cell != _SIGHT_OFF_MAP:
+                    add((r0 + dr, c0 + dc))
+                if blocked:
+                    if cell != _SIGHT_CLEAR:
+                        new_start = r_slope
+                    else:
+                        blocked = False
+                        start = new_start
+                elif cell != _SIGHT_CLEAR and j < radius:
+                    blocked = True
+                    self._cast(visible, r0, c0, origin, j + 1, start, l_slope, rows)
+                    new_start = r_slope
+            if blocked: break
+
+    def window(self, game, view):
+        """Rows of the camera window with only the visible borders, obstacles
+        and items (MapLayers), blank elsewhere; cached until the view, the
+        field of view or the items change. Only rows holding visible cells are
+        built; the rest share one blank string."""
+        visible = self.update(game)
+        key = (view, self.key, game.item_version)
+        if key != self._window_key:
+            top, left, rows, cols = view
+            layers = game.map_layers.update(game)
+            lines = {}
+            for (r, c) in visible:
+                if top <= r < top + rows and left <= c < left + cols:
+                    line = lines.get(r)
+                    if line is None:
+                        line = lines[r] = [' '] * cols
+                    line[c - left] = layers[r][c]
+            blank = ' ' * cols
+            self._window = [''.join(lines[r]) if r in lines else blank for r in range(top, top + rows)]
+            self._window_key = key
+        return self._window
+
+    def sees(self, game, r, c):
+        """Whether (r, c) is in the player's view (and so has line of sight to
+        the player). Cells past the radius on either axis are out of view
+        without running the cast."""
+        p = game.player
+        if abs(r - p.row) > self.radius or abs(c - p.col) > self.radius:
+            return False
+        return (r, c) in self.update(game)
+
+    def hidden_for(self, player, r, c):
+        """Ticks that (r, c) stays out of view for certain, at least 1: the
+        player and a monster there each move at most a cell per tick, so the
+        gap past the radius closes by at most two a tick."""
+        gap = max(abs(r - player.row), abs(c - player.col)) - self.radius
+        return max(1, (gap + 1) // 2)
+# ------------------------------------------------------------------------------
+
+
+
+# --- Spatial Queries ----------------------------------------------------------
+class CellSet:
+    """Set of flat cell ids (r * WIDTH + c) with O(1) add, discard and uniform
+    random choice: members sit densely in `cells` and `pos` gives each id's
+    index there, so a discard swaps the last member in. An id is a member
+    only when cells[pos[id]] is that id, so pos never needs clearing and a
+    whole set can be built from a byte mask at C speed.
+    """
+
+    def __init__(self, cells, pos):
+        self.cells = cells      # array('i') of members
+        self.pos = pos          # array('i') indexed by cell id
+
+    @classmethod
+    def from_mask(cls, mask):
+        """The ids whose byte in `mask` is 1, in ascending order."""
+        cells = array('i', compress(range(len(mask)), mask))
+        pos = array('i', accumulate(mask, initial=-1))   # members seen so far, minus one
+        del pos[0]
+        return cls(cells, pos)
+
+    def copy(self):
+        return CellSet(self.cells[:], self.pos[:])
+
+    def add(self, i):
+        if i not in self:
+            self.pos[i] = len(self.cells)
+            self.cells.append(i)
+
+    def discard(self, i):
+        if i not in self: return
+        p = self.pos[i]
+        last = self.cells.pop()
+        if last != i:
+            self.cells[p] = last
+            self.pos[last] = p
+
+    def choice(self, rng):
+        return self.cells[rng.randrange(len(self.cells))]
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, i):
+        p = self.pos[i]
+        return 0 <= p < len(self.cells) and self.cells[p] == i
+
+
+class BucketGrid:
+    """Monsters hashed into NEAREST_BUCKET_SIZE-square buckets, for nearest and
+    k-nearest queries by Manhattan distance. Searches rings of buckets outward
+    and stops once no unvisited ring can hold anything closer, so a query only
+    touches the buckets around the answer. Buckets are insertion-ordered dicts
+    so results (and ties) are deterministic.
+    """
+
+    def __init__(self, size=NEAREST_BUCKET_SIZE):
+        self.size = size
+        self.buckets = {}   # (bucket row, bucket col) -> {monster: None}
+
+    def add(self, m):
+        self.buckets.setdefault((m.row // self.size, m.col // self.size), {})[m] = None
+
+    def remove(self, m):
+        self._discard(m, (m.row // self.size, m.col // self.size))
+
+    def move(self, m, nr, nc):
+        """Call before updating m.row/m.col."""
+        old = (m.row // self.size, m.col // self.size)
+        new = (nr // self.size, nc // self.size)
+        if old != new:
+            self._discard(m, old)
+            self.buckets.setdefault(new, {})[m] = None
+
+    def _discard(self, m, key):
+        bucket = self.buckets[key]
+        del bucket[m]
+        if not bucket:
+            del self.buckets[key]
+
+    def _ring(self, br, bc, k):
+        if k == 0:
+            yield br, bc
+            return
+        for c in range(bc - k, bc + k + 1):
+            yield br - k, c
+            yield br + k, c
+        for r in range(br - k + 1, br + k):
+            yield r, bc - k
+            yield r, bc + k
+
+    def nearest(self, r, c, k=1, radius=None):
+        """Up to k monsters closest to (r, c), nearest first, optionally within radius."""
+        size = self.size
+        br, bc = r // size, c // size
+        max_ring = max(HEIGHT, WIDTH) // size + 1
+        found = []      # (distance, order, monster)
+        order = 0
+        for ring in range(max_ring + 1):
+            # Nothing in this ring or beyond can be closer than this
+            floor = (ring - 1) * size + 1 if ring else 0
+            if radius is not None and floor > radius: break
+            if len(found) >= k and found[k - 1][0] < floor: break
+            for key in self._ring(br, bc, ring):
+                bucket = self.buckets.get(key)
+                if not bucket: continue
+                for m in bucket:
+                    d = abs(m.row - r) + abs(m.col - c)
+                    if radius is None or d <= radius:
+                        found.append((d, order, m))
+                        order += 1
+            found.sort(key=lambda e: (e[0], e[1]))
+        return [m for _, _, m in found[:k]]
+# ------------------------------------------------------------------------------
+
+
+
+# --- Game World ---------------------------------------------------------------
+# Monster timer phases, in the order one monster's timers run within a tick
+MONSTER_PHASES = ('monster expiry', 'monster shot', 'monster action')
+
+
+class Game:
+    """Self-contained game state plus the per-tick simulation rules.
+    step() never touches stdout, the keyboard or the wall clock, so several
+    instances can run side by side and faster than real time.
+    """
+
+    snapshot_flags = 0      # see SNAPSHOT_ARRAY_MONSTERS
+
+    def __init__(self, monster_cap=MONSTER_CAP, seed=None, obstacles=None, fog=False):
+        # Every random decision comes from this generator, so a seed plus the
+        # per-tick keys reproduces a whole run.
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.monster_cap = monster_cap
+
+        # Countdowns are deadlines on this clock; the wheel fires them when due
+        self.clock = TickClock()
+        self.timers = TimerWheel()
+
+        self.player = Player(HEIGHT//2, WIDTH//2, self.clock)
+        self.obstacle_set = self.spawn_obstacles() if obstacles is None else set(obstacles)
+        self.monsters, self.bullets, self.items = EntityList(), EntityList(), EntityList()
+        self.spawn_warnings, self.death_marks = EntityList(), EntityList()
+        self.sword_effect_cells = []
+
+        # Occupancy index: (r, c) -> entity, so cell queries never scan the lists.
+        # Bullets may stack, so their cells map to a list.
+        self.monster_at, self.item_at, self.warning_at = {}, {}, {}
+        self.bullets_at = {}
+        self.monster_buckets = BucketGrid()
+        self.bullet_pool = BulletPool()
+
+        self.score = self.kill_count = 0
+        self.damage_taken = {}      # monster type -> damage dealt to the player
+
+        # Monster spawn pacing
+        self.base_spawn_interval = 60
+        self.min_spawn_interval = 12
+        self.spawn_timer = self.base_spawn_interval
+
+        # Item spawn pacing
+        self.item_spawn_timer = ITEM_SPAWN_INTERVAL_FRAMES
+
+        # Simulated seconds survived, and the part not yet converted to score
+        self.elapsed = 0.0
+        self.score_clock = 0.0
+
+        # Optional FrameProfiler; step() reports its phases to it
+        self.profiler = None
+
+        # Chasers share one flow field; bump obstacle_version whenever
+        # obstacle_set changes so it gets rebuilt.
+        self.obstacle_version = 0
+        self.flow_field = FlowField()
+
+        # Fog of war: only what the player can see is drawn, and Skeletons
+        # only shoot from cells the player can see
+        self.fov = FieldOfView() if fog else None
+
+        # Border, obstacles and items as pre-drawn map rows for compose_frame;
+        # add_item/remove_item bump item_version so the item layer is redrawn.
+        self.item_version = 0
+        self.map_layers = MapLayers()
+
+        # Walkable (non-obstacle) and free (see is_location_empty, bar the
+        # player) interior cells, for O(1) uniform spawn and waypoint picks.
+        # Occupancy helpers keep free_cells current; both are rebuilt when
+        # obstacle_version changes.
+        self._cells_version = None
+        self._sync_cells()
+
+    def reset(self):
+        """Start a new run on the same map, reusing this instance: the player is
+        restored with Player.reset(), every monster, bullet, item, warning and
+        death mark is removed, and score, pacing and timers start over. The RNG
+        carries on, so a seed still reproduces the whole sequence of runs."""
+        self.clock.now = 0
+        self.timers = TimerWheel()
+        self.player.reset()
+        for m in list(self.monsters): self.remove_monster(m)
+        for b in list(self.bullets): self.remove_bullet(b)
+        for it in list(self.items): self.remove_item(it)
+        for w in list(self.spawn_warnings): self.remove_warning(w)
+        for dm in list(self.death_marks): self.death_marks.remove(dm)
+        self.compact_entities()
+        self.sword_effect_cells = []
+        self.score = self.kill_count = 0
+        self.damage_taken = {}
+        self.spawn_timer = self.base_spawn_interval
+        self.item_spawn_timer = ITEM_SPAWN_INTERVAL_FRAMES
+        self.elapsed = self.score_clock = 0.0
+
+    # Snapshot hooks for the parts whose storage HordeGame changes
+    def _monster_snapshot(self):
+        """(MONSTER_RECORD rows as int32 bytes, order, free slots, capacity).
+        `order` lists monster indices bucket by bucket, so restored buckets
+        keep the insertion order nearest-monster ties depend on."""
+        records = array('i')
+        index = {}
+        for i, m in enumerate(self.monsters):
+            index[id(m)] = i
+            records.extend((m.row, m.col, m.type, m.hp, m.age, m.lifespan, m.frame_since_action,
+                            _nullable(m.target_row), _nullable(m.target_col), _nullable(m.bullet_timer)))
+        order = array('i', [index[id(m)] for bucket in self.monster_buckets.buckets.values() for m in bucket])
+        return records, order, array('i'), 0
+
+    def _restore_monsters(self, records, order, free, capacity, exact):
+        """Rebuild monsters from snapshot records; return them in record order.
+        When the snapshot came from another monster store (not `exact`) their
+        timers are scheduled afresh, as the wheel has none for them."""
+        now = self.frame_count
+        monsters = []
+        for k in range(len(records) // SNAPSHOT_MONSTER_WIDTH):
+            row, col, mtype, hp, age, lifespan, since_action, tr, tc, bt = \
+                records[k * SNAPSHOT_MONSTER_WIDTH:(k + 1) * SNAPSHOT_MONSTER_WIDTH]
+            m = Monster(mtype, row, col)
+            m.hp, m.lifespan = hp, lifespan
+            m.target_row, m.target_col = (None if tr < 0 else tr), (None if tc < 0 else tc)
+            m.clock, m.born = self.clock, now - age
+            if m.speed is not None and m.speed != -1:
+                m.next_action = now + max(1, m.speed) - since_action
+            if mtype == 4:
+                m.next_shot = now + bt
+            self.monsters.append(m)
+            self.monster_at[(row, col)] = m
+            monsters.append(m)
+            if not exact:
+                self.timers.schedule(m.born + m.lifespan, 'monster expiry', self._expire_monster, m)
+                if m.next_action is not None:
+                    self.timers.schedule(m.next_action, 'monster action', self._monster_act, m)
+                if m.next_shot is not None:
+                    self.timers.schedule(m.next_shot, 'monster shot', self._monster_shoot, m)
+        for k in (order if exact else range(len(monsters))):
+            self.monster_buckets.add(monsters[k])
+        return monsters
+
+    def _rng_snapshot(self):
+        """Fields of SNAPSHOT_RNG: the Mersenne Twister state, then the NumPy
+        generator state (unused here)."""
+        _, words, gauss = self.rng.getstate()
+        return (*words, gauss or 0.0, gauss is not None, bytes(16), bytes(16), 0, 0)
+
+    def _restore_rng(self, fields):
+        words, gauss, has_gauss = fields[:625], fields[625], fields[626]
+        self.rng.setstate((3, tuple(words), gauss if has_gauss else None))
+
+    @property
+    def is_over(self):
+        return self.player.hp <= 0
+
+    @property
+    def frame_count(self):
+        return self.clock.now
+
+    @frame_count.setter
+    def frame_count(self, tick):
+        self.clock.now = tick
+
+    def state_hash(self, value=0):
+        """CRC32 of everything that decides future ticks; pass the previous
+        result as `value` to fold a run of ticks into one running hash."""
+        p = self.player
+        state = (
+            (p.row, p.col, p.hp, p.attack, p.length,
+             p.strength_timer, p.magic_timer, p.shield_timer, p.magic_cooldown),
+            self.score, self.kill_count, self.frame_count, self.spawn_timer, self.item_spawn_timer,
+            [(m.type, m.row, m.col, m.hp, m.age, m.frame_since_action,
+              m.target_row, m.target_col, m.bullet_timer) for m in self.monsters],
+            [(b.row, b.col, b.dx, b.dy, b.sx, b.sy, b.err, b.next_move,
+              b.damage, b.from_player) for b in self.bullets],
+            [(it.type, it.row, it.col) for it in self.items],
+            [(w['row'], w['col'], w['phase'], w['due'], w['monster'].type) for w in self.spawn_warnings],
+            [(dm['row'], dm['col'], dm['expires']) for dm in self.death_marks],
+        )
+        return zlib.crc32(repr(state).encode(), value)
+
+    def is_location_empty(self, r, c):
+        if not is_location_valid (r, c): return False
+        if (r, c) == (self.player.row, self.player.col): return False
+        if (r, c) in self.obstacle_set: return False
+        if (r, c) in self.monster_at: return False
+        if (r, c) in self.item_at: return False
+        if (r, c) in self.warning_at: return False
         return True
-    return False
+
+    def _sync_cells(self):
+        if self._cells_version == self.obstacle_version: return
+        self._cells_version = self.obstacle_version
+        mask = bytearray(b'\x01') * (HEIGHT * WIDTH)
+        mask[:WIDTH] = mask[-WIDTH:] = bytes(WIDTH)
+        mask[::WIDTH] = mask[WIDTH - 1::WIDTH] = bytes(HEIGHT)
+        for r, c in self.obstacle_set:
+            mask[r * WIDTH + c] = 0
+        self.walkable_cells = CellSet.from_mask(mask)
+        self.free_cells = self.walkable_cells.copy()
+        occupied = [(m.row, m.col) for m in self.monsters]
+        for r, c in (*occupied, *self.item_at, *self.warning_at):
+            self.free_cells.discard(r * WIDTH + c)
+
+    def random_free_cell(self):
+        """A uniformly random cell where is_location_empty holds, or None."""
+        self._sync_cells()
+        free = self.free_cells
+        player_cell = self.player.row * WIDTH + self.player.col
+        while len(free):
+            i = free.choice(self.rng)
+            if i != player_cell:
+                return divmod(i, WIDTH)
+            if len(free) == 1:
+                break
+        return None
+
+    def random_walkable_cell(self):
+        """A uniformly random interior non-obstacle cell, or None."""
+        self._sync_cells()
+        if not len(self.walkable_cells): return None
+        return divmod(self.walkable_cells.choice(self.rng), WIDTH)
+
+    def _occupy(self, r, c):
+        self.free_cells.discard(r * WIDTH + c)
+
+    def _vacate(self, r, c):
+        # Monsters can stand on items, so a cell is only free once nothing is left
+        cell = (r, c)
+        if cell in self.monster_at or cell in self.item_at or cell in self.warning_at: return
+        if cell in self.obstacle_set: return
+        self.free_cells.add(r * WIDTH + c)
+
+    # Every spawn, move and removal goes through these helpers to keep the
+    # occupancy index and free cells in step with the entity lists.
+    def add_monster(self, m):
+        self.monsters.append(m)
+        self.monster_at[(m.row, m.col)] = m
+        self.monster_buckets.add(m)
+        self._occupy(m.row, m.col)
+        self._start_monster_timers(m)
+
+    def move_monster(self, m, nr, nc):
+        del self.monster_at[(m.row, m.col)]
+        self.monster_buckets.move(m, nr, nc)
+        self._vacate(m.row, m.col)
+        m.row, m.col = nr, nc
+        self.monster_at[(nr, nc)] = m
+        self._occupy(nr, nc)
+
+    def remove_monster(self, m):
+        self.monsters.remove(m)
+        del self.monster_at[(m.row, m.col)]
+        self.monster_buckets.remove(m)
+        self._vacate(m.row, m.col)
+
+    def add_bullet(self, b):
+        self.bullets.append(b)
+        self.bullets_at.setdefault((b.row, b.col), []).append(b)
+        # First step on the BULLET_STEP_FRAMES-th bullet update, counting this tick's
+        b.next_move = self.frame_count + BULLET_STEP_FRAMES - 1
+        self.timers.schedule(b.next_move, 'bullets', self._step_bullet, b, b.gen)
+
+    def move_bullet(self, b, nr, nc):
+        self._unindex_bullet(b)
+        b.row, b.col = nr, nc
+        self.bullets_at.setdefault((nr, nc), []).append(b)
+
+    def remove_bullet(self, b):
+        self.bullets.remove(b)
+        self._unindex_bullet(b)
+        b.gen += 1
+        self.bullet_pool.release(b)
+
+    def _unindex_bullet(self, b):
+        cell = (b.row, b.col)
+        stack = self.bullets_at[cell]
+        stack.remove(b)
+        if not stack:
+            del self.bullets_at[cell]
+
+    def add_item(self, it):
+        self.items.append(it)
+        self.item_at[(it.row, it.col)] = it
+        self._occupy(it.row, it.col)
+        self.item_version += 1
+
+    def remove_item(self, it):
+        self.items.remove(it)
+        del self.item_at[(it.row, it.col)]
+        self._vacate(it.row, it.col)
+        self.item_version += 1
+
+    def add_warning(self, w):
+        self.spawn_warnings.append(w)
+        self.warning_at[(w['row'], w['col'])] = w
+        self._occupy(w['row'], w['col'])
+        # Phases last 20 updates, counting the one later this tick
+        w['due'] = self.frame_count + 19
+        self.timers.schedule(w['due'], 'warnings', self._advance_warning, w)
+
+    def remove_warning(self, w):
+        self.spawn_warnings.remove(w)
+        del self.warning_at[(w['row'], w['col'])]
+        self._vacate(w['row'], w['col'])
+
+    def add_death_mark(self, r, c):
+        dm = {'row': r, 'col': c, 'expires': self.frame_count + DEATH_MARK_DURATION - 1}
+        self.death_marks.append(dm)
+        self.timers.schedule(dm['expires'], 'death marks', self._expire_death_mark, dm)
+
+    def _expire_death_mark(self, dm):
+        if dm in self.death_marks:
+            self.death_marks.remove(dm)
+
+    def compact_entities(self):
+        """Drop the holes this tick's removals left in the entity lists."""
+        for group in (self.monsters, self.bullets, self.items, self.spawn_warnings, self.death_marks):
+            group.compact()
+
+    def update_death_marks(self):
+        """Remove the death marks that expire this tick."""
+        self.timers.fire(self.frame_count, 'death marks')
+
+    def spawn_obstacles(self):
+        """Generate interior obstacles according to density: distinct cells
+        drawn without replacement, never the player's."""
+        inner = WIDTH - 2
+        area = inner * (HEIGHT - 2)
+        target_count = min(int(area * OBSTACLE_DENSITY), area - 1)
+        player = (self.player.row - 1) * inner + self.player.col - 1
+        obstacle_set = set()
+        for i in self.rng.sample(range(area - 1), target_count):
+            if i >= player: i += 1
+            obstacle_set.add((1 + i // inner, 1 + i % inner))
+        return obstacle_set
+
+    def spawn_monster(self):
+        """Propose a new monster at a free interior cell, with weights."""
+        types = list(monster_stats.keys())
+        weights = [monster_stats[t].get('weight', 1) for t in types]
+        mtype = self.rng.choices(types, weights=weights, k=1)[0]
+        cell = self.random_free_cell()
+        return Monster(mtype, *cell) if cell else None
+
+    def kill_monster(self, monster):
+        self.add_death_mark(monster.row, monster.col)
+        self.remove_monster(monster)
+
+    def spawn_item(self):
+        """Propose a new item at a free interior cell (random type)."""
+        itype = self.rng.choice(['H', 'S', 'M', 'D'])
+        cell = self.random_free_cell()
+        return Item(itype, *cell) if cell else None
+
+    def apply_item_effect(self, t):
+        """Apply item effect and timers."""
+        player = self.player
+        if t == 'H':
+            player.hp = min(player.max_hp, player.hp + 25)
+        elif t == 'S':
+            player.length = 10
+            player.strength_timer = 600
+            self.timers.schedule(player.strength_until, 'buffs', self._end_strength)
+        elif t == 'M':
+            player.magic_cooldown = 0
+            player.magic_timer = 800
+            self.timers.schedule(player.magic_ready, 'buffs', self.auto_magic_shoot, player.magic_ready)
+        elif t == 'D':
+            player.shield_timer = 500
+
+    def process_player_action(self, key):
+        """Handle movement and melee attack (IJKL), with obstacle blocking."""
+        player = self.player
+        self.sword_effect_cells = []
+
+        # Movement
+        if key == 'w':
+            nr, nc = player.row - 1, player.col
+        elif key == 's':
+            nr, nc = player.row + 1, player.col
+        elif key == 'a':
+            nr, nc = player.row, player.col - 1
+        elif key == 'd':
+            nr, nc = player.row, player.col + 1
+        else:
+            nr, nc = player.row, player.col
+
+        if key in ['w', 'a', 's', 'd']:
+            if is_location_valid(nr, nc) and not ((nr, nc) in self.obstacle_set):
+                m = self.monster_at.get((nr, nc))
+                if m is not None:
+                    if m.type in (1, 2, 3):
+                        self.hurt_player(m.atk, m.type)
+                        self.kill_monster(m)
+                else:
+                    it = self.item_at.get((nr, nc))
+                    if it is not None:
+                        self.apply_item_effect(it.type)
+                        self.remove_item(it)
+                    player.row, player.col = nr, nc
+
+        # Attack
+        if key in ['i', 'j', 'k', 'l']:
+            if key == 'i':   dr, dc, sym = -1, 0, '|'
+            elif key == 'k': dr, dc, sym = 1,  0, '|'
+            elif key == 'j': dr, dc, sym = 0, -1, '-'
+            else:            dr, dc, sym = 0,  1, '-'
+            r, c = player.row, player.col
+            for step in range(1, player.length + 1):
+                tr, tc = r + dr * step, c + dc * step
+                if not is_location_valid(tr, tc): break
+                if (tr, tc) in self.obstacle_set: break
+                m = self.monster_at.get((tr, tc))
+                if m is not None:
+                    m.hp -= player.attack
+                    if m.hp <= 0:
+                        self.kill_monster(m)
+                        self.kill_count += 1
+                        self.score += m.score
+                elif (tr, tc) in self.bullets_at:
+                    self.remove_bullet(self.bullets_at[(tr, tc)][0])
+                self.sword_effect_cells.append((tr, tc, sym))
+
+    def hurt_player(self, amount, mtype):
+        """Deal damage from a monster of type `mtype` unless the shield is up."""
+        if self.player.shield_timer > 0: return
+        self.player.hp -= amount
+        self.damage_taken[mtype] = self.damage_taken.get(mtype, 0) + amount
+
+    def update_player_buffs(self):
+        """Fire the buff timers due this tick: strength expiry and magic shots.
+        The shield needs none; shield_timer reads its deadline directly."""
+        self.timers.fire(self.frame_count, 'buffs')
+
+    def _end_strength(self):
+        # A later S pickup pushed the deadline back; its own timer will handle it
+        if self.player.strength_timer == 0:
+            self.player.length = PLAYER_WEAPON_LENGTH
+
+    def _start_monster_timers(self, m):
+        """Schedule a newly added monster's expiry, actions and (Skeletons) shots."""
+        now = self.frame_count
+        m.clock, m.born = self.clock, now
+        self.timers.schedule(now + m.lifespan, 'monster expiry', self._expire_monster, m)
+        if m.speed is not None and m.speed != -1:
+            m.next_action = now + max(1, m.speed)
+            self.timers.schedule(m.next_action, 'monster action', self._monster_act, m)
+        if m.type == 4:
+            m.next_shot = now + m.stats['bullet_cooldown']
+            self.timers.schedule(m.next_shot, 'monster shot', self._monster_shoot, m)
+
+    def _in_game(self, m):
+        # Monster timers are never cancelled; a dead monster's just find it gone
+        return self.monster_at.get((m.row, m.col)) is m
+
+    def update_monsters(self):
+        """Fire the monster timers due this tick: lifespan expiry, then Skeleton
+        shot, then speed-gated movement and collisions. They run monster by
+        monster in list order, not in the order they were scheduled, so random
+        draws and blocking play out as when every monster was updated in turn."""
+        now, timers, index = self.frame_count, self.timers, self.monsters.index
+        due = []
+        for rank, phase in enumerate(MONSTER_PHASES):
+            due += [(index.get(id(args[0]), -1) * 3 + rank, fn, args)
+                    for _, _, fn, args in timers.take(now, phase)]
+        due.sort(key=itemgetter(0))
+        for _, fn, args in due:
+            fn(*args)
+
+    def _expire_monster(self, m):
+        if self._in_game(m):
+            self.kill_monster(m)
+
+    def _monster_shoot(self, m):
+        if not self._in_game(m): return
+        player = self.player
+        if self.fov and not self.fov.sees(self, m.row, m.col):
+            # No line of sight: hold the shot and look again once the player could be in view
+            m.next_shot = self.frame_count + self.fov.hidden_for(player, m.row, m.col)
+        else:
+            self.add_bullet(make_bullet_towards(m.row, m.col, player.row, player.col, m.atk, False, self.bullet_pool))
+            m.next_shot += m.stats['bullet_cooldown']
+        self.timers.schedule(m.next_shot, 'monster shot', self._monster_shoot, m)
+
+    def _monster_act(self, m):
+        if not self._in_game(m): return
+        player = self.player
+        m.next_action += max(1, m.speed)
+        self.timers.schedule(m.next_action, 'monster action', self._monster_act, m)
+
+        if m.type in (2, 4):  # random waypoint walker
+            if m.target_row is None or (m.row == m.target_row and m.col == m.target_col):
+                m.target_row, m.target_col = self.random_walkable_cell()
+            dr = (-1 if m.target_row < m.row else 1 if m.target_row > m.row else 0)
+            dc = (-1 if m.target_col < m.col else 1 if m.target_col > m.col else 0)
+            if dr != 0 and dc != 0:
+                if self.rng.random() < 0.5: dc = 0
+                else: dr = 0
+            nr, nc = m.row + dr, m.col + dc
+            if not is_location_valid(nr, nc):
+                m.target_row = None
+            elif (nr, nc) in self.obstacle_set:
+                m.target_row = None
+            elif (nr, nc) in self.monster_at:
+                m.target_row = None
+            elif (nr, nc) == (player.row, player.col):
+                self.hurt_player(m.atk, m.type)
+                if m.type == 2:
+                    self.kill_monster(m)
+                    return
+                m.target_row = None
+            else:
+                self.move_monster(m, nr, nc)
+
+        elif m.type == 3:     # chaser
+            self.flow_field.update(self)
+            step = self.flow_field.next_cell(m.row, m.col, player.row, player.col, self.monster_at)
+            if step is not None:
+                nr, nc = step
+            else:
+                # Beyond the flow field: greedy step toward the player
+                dr = (-1 if player.row < m.row else 1 if player.row > m.row else 0)
+                dc = (-1 if player.col < m.col else 1 if player.col > m.col else 0)
+                if dr != 0 and dc != 0: dc = 0
+                nr, nc = m.row + dr, m.col + dc
+                if not is_location_valid(nr, nc) or ((nr, nc) in self.obstacle_set):
+                    nr, nc = m.row, m.col
+                    if dr != 0 and dc == 0:
+                        nc = m.col + (-1 if player.col < m.col else 1 if player.col > m.col else 0)
+                    elif dc != 0 and dr == 0:
+                        nr = m.row + (-1 if player.row < m.row else 1 if player.row > m.row else 0)
+            if (nr, nc) != (m.row, m.col):
+                if (nr, nc) not in self.monster_at:
+                    if (nr, nc) == (player.row, player.col):
+                        self.hurt_player(m.atk, m.type)
+                        if m.type in (1, 2, 3):
+                            self.kill_monster(m)
+                            return
+                    else:
+                        self.move_monster(m, nr, nc)
+
+    def static_monster_attack(self):
+        """Type-1 static monster triggers when player is adjacent, then disappears."""
+        player = self.player
+        for m in self.monsters:
+            if m.type == 1:
+                if abs(m.row - player.row) <= 1 and abs(m.col - player.col) <= 1 and (m.row, m.col) != (player.row, player.col):
+                    self.hurt_player(m.atk, m.type)
+                    self.kill_monster(m)
+
+    def update_bullets(self):
+        """Step the bullets whose move timer fires this tick and resolve collisions."""
+        self.timers.fire(self.frame_count, 'bullets')
+
+    def _step_bullet(self, b, gen):
+        """Move one bullet (Bresenham-like targeted steps) and resolve collisions."""
+        if b.gen != gen: return     # removed since this step was scheduled
+        player = self.player
+        if b.has_target:
+            e2 = 2 * b.err
+            nr, nc = b.row, b.col
+            if e2 > -b.dy:
+                b.err -= b.dy
+                nc = b.col + b.sx
+            if e2 < b.dx:
+                b.err += b.dx
+                nr = b.row + b.sy
+        else:
+            nr, nc = b.row + b.dr, b.col + b.dc
+
+        if not is_location_valid(nr, nc) or ((nr, nc) in self.obstacle_set):
+            self.remove_bullet(b)
+            return
+
+        if b.from_player:
+            hit = self.monster_at.get((nr, nc))
+            if hit:
+                hit.hp -= b.damage
+                if hit.hp <= 0:
+                    self.add_death_mark(hit.row, hit.col)
+                    self.kill_count += 1
+                    self.score += hit.score
+                    self.remove_monster(hit)
+                self.remove_bullet(b)
+            else:
+                self.move_bullet(b, nr, nc)
+        else:
+            if (nr, nc) == (player.row, player.col):
+                self.hurt_player(b.damage, 4)    # only Skeletons shoot
+                self.remove_bullet(b)
+                return
+            if (nr, nc) in self.monster_at:
+                self.remove_bullet(b)
+            else:
+                self.move_bullet(b, nr, nc)
+
+        if b.gen == gen:    # still flying
+            b.next_move += BULLET_STEP_FRAMES
+            self.timers.schedule(b.next_move, 'bullets', self._step_bullet, b, gen)
+
+    def spawn_monsters_check(self):
+        """Countdown to spawn waves; create warning markers; respect monster cap."""
+        self.spawn_timer -= 1
+        if self.spawn_timer <= 0:
+            if len(self.monsters) < self.monster_cap:
+                to_spawn = 1
+                if self.score > 600: to_spawn = 3
+                elif self.score > 300: to_spawn = 2
+                to_spawn = min(to_spawn, self.monster_cap - len(self.monsters))
+                for _ in range(to_spawn):
+                    m = self.spawn_monster()
+                    if m:
+                        self.add_warning({'row': m.row,'col': m.col,'phase': 0,'monster': m})
+            interval = self.base_spawn_interval - self.score // 200
+            if interval < self.min_spawn_interval: interval = self.min_spawn_interval
+            self.spawn_timer = interval
+
+    def process_spawn_warnings(self):
+        """Flash '!' for 6 phases (each 20 frames), then spawn if cell is free."""
+        self.timers.fire(self.frame_count, 'warnings')
+
+    def _advance_warning(self, w):
+        # Like the monster timers: one removed outside the wheel finds it gone
+        if self.warning_at.get((w['row'], w['col'])) is not w: return
+        player = self.player
+        w['phase'] += 1
+        if w['phase'] < 6:
+            w['due'] += 20
+            self.timers.schedule(w['due'], 'warnings', self._advance_warning, w)
+            return
+        r, c = w['row'], w['col']
+        m = w['monster']
+        blocked = ((r, c) == (player.row, player.col)
+                   or (r, c) in self.obstacle_set
+                   or (r, c) in self.monster_at
+                   or (r, c) in self.item_at)
+        if not blocked and len(self.monsters) < self.monster_cap:
+            self.add_monster(m)
+        self.remove_warning(w)
+
+    def spawn_items_check(self):
+        """Fixed-interval item spawns with global cap."""
+        self.item_spawn_timer -= 1
+        if self.item_spawn_timer > 0: return
+        self.item_spawn_timer = ITEM_SPAWN_INTERVAL_FRAMES
+        if len(self.items) >= ITEM_CAP: return
+        it = self.spawn_item()
+        if it: self.add_item(it)
+
+    def nearest_monsters(self, r, c, k=1, radius=None):
+        """Up to k monsters closest to (r, c) by Manhattan distance, nearest first,
+        optionally only those within `radius`."""
+        if len(self.monsters) > LINEAR_SCAN_LIMIT:
+            return self.monster_buckets.nearest(r, c, k, radius)
+        found = [(abs(m.row - r) + abs(m.col - c), i, m) for i, m in enumerate(self.monsters)]
+        if radius is not None:
+            found = [e for e in found if e[0] <= radius]
+        found.sort(key=lambda e: (e[0], e[1]))
+        return [m for _, _, m in found[:k]]
+
+    def find_nearest_monster(self, pr, pc):
+        """Return nearest monster and direction hints (dr, dc) from player."""
+        found = self.nearest_monsters(pr, pc)
+        if not found: return (None, 0, 0)
+        nearest = found[0]
+        dr = 0 if nearest.row == pr else (1 if nearest.row > pr else -1)
+        dc = 0 if nearest.col == pc else (1 if nearest.col > pc else -1)
+        return nearest, dr, dc
+
+    def auto_magic_shoot(self, ready):
+        """Auto-shoot toward nearest monster while magic buff is active, then
+        schedule the next attempt. `ready` is the tick this attempt was
+        scheduled for; a newer M pickup moves magic_ready and retires it."""
+        player = self.player
+        if ready != player.magic_ready or player.magic_timer <= 0: return
+        target, _, _ = self.find_nearest_monster(player.row, player.col)
+        if target is None:
+            player.magic_cooldown = 4
+        else:
+            self.add_bullet(make_bullet_towards(player.row, player.col, target.row, target.col, player.attack, True,
+                                                self.bullet_pool))
+            player.magic_cooldown = MAGIC_SHOOT_INTERVAL + 1
+        self.timers.schedule(player.magic_ready, 'buffs', self.auto_magic_shoot, player.magic_ready)
+
+    def step(self, action=None, dt=FRAME_INTERVAL_SEC):
+        """Advance the world by one tick, in the same order the main loop always used.
+        `action` is one of wasd/ijkl or None; `dt` is the simulated time the tick
+        covers (only used for the +1 score per survived second).
+        """
+        mark = self.profiler.mark if self.profiler else _no_mark
+
+        if action: self.process_player_action(action)
+        else:      self.sword_effect_cells = []
+        mark('player')
+
+        self.update_player_buffs();   mark('buffs')
+        self.update_monsters();       mark('monsters')
+        self.static_monster_attack(); mark('static')
+        self.update_bullets();        mark('bullets')
+        self.update_death_marks();    mark('death marks')
+
+        self.spawn_monsters_check()
+        self.process_spawn_warnings()
+        self.spawn_items_check()
+        mark('spawns')
+
+        self.compact_entities()
+        self.frame_count += 1
+
+        # scoring: +1 per survived second
+        self.elapsed += dt
+        self.score_clock += dt
+        sec_gain = int(self.score_clock)
+        if sec_gain >= 1:
+            self.score += sec_gain
+            self.score_clock -= sec_gain
 # ------------------------------------------------------------------------------
 
 
 
 # --- Screen-Related Functions --------------------------------------------------------
 def clear_screen():
-    """Fallback full clear (used for pause screen only)."""
-    os.system('cls')
+    """Clear the screen in-process with ANSI codes (start, pause and game over
+    pages), rather than running a shell command for every clear."""
+    sys.stdout.write(CURSOR_HOME + ERASE_DOWN)
+    sys.stdout.flush()
 
 
-def print_map():
-    """Compose the frame and paint it via absolute cursor addressing (no scrolling).
+class Camera:
+    """The part of the map that gets drawn. Sized to the terminal unless rows/cols
+    are given, and scrolled only when the player comes within a quarter of the
+    window from its edge, so most frames keep the same window.
+    """
+
+    def __init__(self, rows=None, cols=None):
+        self.rows = rows
+        self.cols = cols
+        self.top = self.left = 0
+
+    def window(self, player):
+        """Return (top, left, rows, cols) of the map cells to draw this frame."""
+        rows, cols = self.rows, self.cols
+        if rows is None or cols is None:
+            size = shutil.get_terminal_size()
+            rows = rows or size.lines - HEADER_LINES - 1
+            cols = cols or (size.columns + 1) // 2   # cells are drawn space-separated
+        rows = max(1, min(rows, HEIGHT))
+        cols = max(1, min(cols, WIDTH))
+        self.top = _follow(self.top, player.row, rows, HEIGHT)
+        self.left = _follow(self.left, player.col, cols, WIDTH)
+        return self.top, self.left, rows, cols
+
+
+def _follow(start, pos, size, limit):
+    margin = size // 4
+    if pos < start + margin:
+        start = pos - margin
+    elif pos >= start + size - margin:
+        start = pos - size + margin + 1
+    return max(0, min(start, limit - size))
+
+
+def _window_cells(top, left, rows, cols):
+    for r in range(top, top + rows):
+        for c in range(left, left + cols):
+            yield r, c
+
+
+class MapLayers:
+    """The layers that rarely change, pre-drawn as one string per map row:
+    border and obstacles, redrawn when obstacle_version moves on, and those
+    plus items, redrawn from them when item_version does. compose_frame
+    starts each frame from slices of these rows."""
+
+    def __init__(self):
+        self.static_key = self.items_key = None
+        self.static = self.rows = None
+
+    def update(self, game):
+        """Return the map rows with border, obstacles and items drawn."""
+        key = (game.obstacle_version, HEIGHT, WIDTH)
+        if key != self.static_key:
+            self.static_key, self.items_key = key, None
+            inner = '+' + ' ' * (WIDTH - 2) + '+' if WIDTH > 1 else '+'
+            rows = [list(inner) for _ in range(HEIGHT)]
+            rows[0] = rows[-1] = ['+'] * WIDTH
+            for (r, c) in game.obstacle_set:
+                if is_location_valid(r, c):
+                    rows[r][c] = '#'
+            self.static = [''.join(row) for row in rows]
+        key = (self.static_key, game.item_version)
+        if key != self.items_key:
+            self.items_key = key
+            self.rows = rows = self.static[:]
+            for it in game.items:
+                if is_location_valid(it.row, it.col):
+                    row = rows[it.row]
+                    rows[it.row] = row[:it.col] + it.char + row[it.col + 1:]
+        return self.rows
+
+
+def _fog_grid(game, view):
+    """Fog-of-war window: the cached visible terrain (FieldOfView.window) with
+    the bullets, monsters and player in view drawn on top. Entities are found
+    from their lists or by probing the visible cells, whichever is shorter, so
+    the work follows the field of view rather than the window or the map.
+    Returns (grid, visible)."""
+    top, left, rows, cols = view
+    bottom, right = top + rows, left + cols
+    fov = game.fov
+    grid = [list(line) for line in fov.window(game, view)]
+    visible = fov.visible
+    n = len(visible)
+
+    if len(game.bullets) <= n:
+        cells = [cell for cell in ((b.row, b.col) for b in game.bullets) if cell in visible]
+    else:
+        cells = [cell for cell in visible if cell in game.bullets_at]
+    for (r, c) in cells:
+        if top <= r < bottom and left <= c < right:
+            grid[r - top][c - left] = '*'
+
+    if len(game.monsters) <= n:
+        monsters = [m for m in game.monsters if (m.row, m.col) in visible]
+    else:
+        monsters = [m for m in map(game.monster_at.get, visible) if m is not None]
+    for m in monsters:
+        if top <= m.row < bottom and left <= m.col < right:
+            grid[m.row - top][m.col - left] = m.char
+
+    p = game.player
+    if top <= p.row < bottom and left <= p.col < right:
+        grid[p.row - top][p.col - left] = '@'
+    return grid, visible
+
+
+def compose_frame(game, camera=None):
+    """Compose the frame as (header_lines, grid) without writing anything.
+    Only the camera window is built (the whole map without a camera). It starts
+    as a slice of the cached border, obstacle and item rows (see MapLayers);
+    each remaining layer is drawn from its entity list when that is smaller than
+    the window, else from the occupancy index cell by cell, so off-screen
+    entities cost nothing. In fog-of-war mode only the cells in the player's
+    field of view are drawn (see _fog_grid) and the rest stay blank.
     Rendering order (later ones can visually overwrite earlier ones if overlapping):
       1) Borders
       2) Obstacles
@@ -274,71 +1745,79 @@ def print_map():
       9) Death marks ('x') – cosmetic, non-blocking
     Header lines (time/hp/score/status) are written before the map rows.
     """
-    grid = [[' ' for _ in range(WIDTH)] for _ in range(HEIGHT)]
-
-    # Borders
-    for x in range(WIDTH):
-        grid[0][x] = '+'
-        grid[HEIGHT - 1][x] = '+'
-
-    for y in range(HEIGHT):
-        grid[y][0] = '+'
-        grid[y][WIDTH - 1] = '+'
-
-    # Obstacles
-    for (r, c) in obstacle_set:
-        set_grid(grid, r, c, '#')
-
-    # Items
-    for it in items:
-        set_grid(grid, it.row, it.col, it.char)
-
-    # Bullets
-    for b in bullets:
-        set_grid(grid, b.row, b.col, '*')
+    player = game.player
+    view = camera.window(player) if camera else (0, 0, HEIGHT, WIDTH)
+    top, left, rows, cols = view
+    bottom, right = top + rows, left + cols
+    area = rows * cols
+
+    if game.fov:
+        grid, visible = _fog_grid(game, view)
+    else:
+        visible = None
+        # Borders, obstacles and items
+        grid = [list(line[left:right]) for line in game.map_layers.update(game)[top:bottom]]
+
+    def put(r, c, ch):
+        if top <= r < bottom and left <= c < right and is_location_valid(r, c) \
+                and (visible is None or (r, c) in visible):
+            grid[r - top][c - left] = ch
+
+    if visible is None:
+        # Bullets
+        if len(game.bullets) <= area:
+            cells = [(b.row, b.col) for b in game.bullets]
+        else:
+            cells = [cell for cell in _window_cells(*view) if cell in game.bullets_at]
+        for (r, c) in cells:
+            put(r, c, '*')
 
-    # Monsters
-    for m in monsters:
-        set_grid(grid, m.row, m.col, m.char)
+        # Monsters
+        if len(game.monsters) <= area:
+            monsters = game.monsters
+        else:
+            monsters = [m for m in map(game.monster_at.get, _window_cells(*view)) if m is not None]
+        for m in monsters:
+            put(m.row, m.col, m.char)
 
-    # Player
-    set_grid(grid, player.row, player.col, '@')
+        # Player
+        put(player.row, player.col, '@')
 
     # Sword effects
-    if sword_effect_cells:
-        for (r, c, ch) in sword_effect_cells:
+    if game.sword_effect_cells:
+        for (r, c, ch) in game.sword_effect_cells:
             # Only draw sword effects on empty floor to avoid hiding entities.
-            if grid[r][c] == ' ':
-                set_grid(grid, r, c, ch)
+            if top <= r < bottom and left <= c < right and grid[r - top][c - left] == ' ':
+                put(r, c, ch)
 
     # Spawn warnings
-    for w in spawn_warnings:
+    for w in game.spawn_warnings:
         if w.get('phase', 0) % 2 == 0:
-            set_grid(grid, w['row'], w['col'], '!')
+            put(w['row'], w['col'], '!')
 
     # Death marks
-    for dm in death_marks:
-        set_grid(grid, dm['row'], dm['col'], 'x')
+    for dm in game.death_marks:
+        put(dm['row'], dm['col'], 'x')
 
     # Compose header lines (with colors on Time/Score in yellow, HP in green)
     lines = []
-    elapsed_secs = int(time.time() - start_time)
+    elapsed_secs = int(game.elapsed)
 
     if SUPPORT_COLOR:
         hp_part    = f"HP: {BRIGHT_GREEN}{player.hp}/{player.max_hp}{RESET}"
         time_part  = f"Time: {BRIGHT_YELLOW}{elapsed_secs} s{RESET}"
-        score_part = f"Score: {BRIGHT_YELLOW}{score}{RESET}"
-        kill_part = f"Kills: {BRIGHT_YELLOW}{kill_count}{RESET}"
+        score_part = f"Score: {BRIGHT_YELLOW}{game.score}{RESET}"
+        kill_part = f"Kills: {BRIGHT_YELLOW}{game.kill_count}{RESET}"
     else:
         hp_part    = f"HP: {player.hp}/{player.max_hp}"
         time_part  = f"Time: {elapsed_secs}s"
-        score_part = f"Score: {score}"
-        kill_part = f"Kills: {kill_count}"
+        score_part = f"Score: {game.score}"
+        kill_part = f"Kills: {game.kill_count}"
 
     # Keep the rest (kills/monsters/items) uncolored
     lines.append(
         f"{hp_part}  {time_part}  {score_part}  {kill_part}"
-        f"  Monsters: {len(monsters)}/{MONSTER_CAP}  Items: {len(items)}/{ITEM_CAP}"
+        f"  Monsters: {len(game.monsters)}/{game.monster_cap}  Items: {len(game.items)}/{ITEM_CAP}"
     )
     effects = []
     if SUPPORT_COLOR:
@@ -349,23 +1828,220 @@ def print_map():
         if player.strength_timer > 0: effects.append("Strength")
         if player.magic_timer > 0:    effects.append("Magic")
         if player.shield_timer > 0:   effects.append("Defense")
-    lines.append("Status: " + (", ".join(effects) if effects else "None"))
-
-    # Map rows – add a space between characters for readability; colorize per char.
-    for y in range(HEIGHT):
-        colored_row = [colorize_char(ch) for ch in grid[y]]
-        lines.append(" ".join(colored_row))
-
-    # Absolute painting without newlines to avoid terminal scrolling
-    total = len(lines)
-    sys.stdout.write(CURSOR_HOME)
-    for i, line in enumerate(lines, start=1):
-        sys.stdout.write(goto(i, 1))
-        sys.stdout.write(line)
-        sys.stdout.write(ERASE_LINE)
-    sys.stdout.write(goto(total + 1, 1))
-    sys.stdout.write(ERASE_DOWN)
-    sys.stdout.flush()
+    status = "Status: " + (", ".join(effects) if effects else "None")
+    if game.profiler:
+        status += "    " + game.profiler.hud
+    lines.append(status)
+
+    return lines, grid
+
+
+# Pre-encoded color code of each colored glyph (by byte value), and runs of
+# colored glyphs in a space-separated row
+GLYPH_CODES = {ord(ch): code.encode() for chars, code in (('@', BRIGHT_YELLOW),
+                                                         (MONSTER_CHAR_SET | {'!'}, BRIGHT_RED),
+                                                         (ITEM_CHAR_SET, BRIGHT_GREEN)) for ch in chars}
+_glyphs = re.escape(bytes(sorted(GLYPH_CODES)))
+COLOR_RUN = re.compile(b"[%s](?: [%s])*" % (_glyphs, _glyphs))
+RESET_CODE = RESET.encode()
+
+
+def _color_run(m):
+    """Wrap each same-colored stretch of a run in one color code and RESET."""
+    run = m.group()
+    if len(run) == 1:
+        return GLYPH_CODES[run[0]] + run + RESET_CODE
+    glyphs = run[::2]
+    out, start = [], 0
+    for i in range(1, len(glyphs) + 1):
+        if i == len(glyphs) or GLYPH_CODES[glyphs[i]] != GLYPH_CODES[glyphs[start]]:
+            out.append(GLYPH_CODES[glyphs[start]] + run[2 * start:2 * i - 1] + RESET_CODE)
+            start = i
+    return b' '.join(out)
+
+
+def encode_cells(cells):
+    """Map cells as the bytes painted for them: space-separated, colored as
+    colorize_char does, but with one color code and RESET per run of
+    same-colored glyphs rather than per glyph (the spaces inside a run take
+    the color, which changes nothing on screen)."""
+    line = ' '.join(cells).encode()
+    return COLOR_RUN.sub(_color_run, line) if SUPPORT_COLOR else line
+
+
+def write_frame(data):
+    """Write painted bytes in one call, through the binary layer when stdout
+    is a plain text stream (not e.g. a wrapper that translates ANSI codes)."""
+    out = sys.stdout
+    if type(out) is io.TextIOWrapper:
+        out.flush()         # anything printed before must land first
+        out.buffer.write(data)
+        out.buffer.flush()
+    else:
+        out.write(data.decode())
+        out.flush()
+
+
+class DiffRenderer:
+    """Remembers the frame currently on screen and repaints only what changed.
+    The first frame (and any frame after invalidate()) is painted in full.
+    `write_ns` is how long the last paint spent writing to the terminal.
+    """
+
+    def __init__(self, profiler=None):
+        self.prev_header = None
+        self.prev_grid = None
+        self.profiler = profiler
+        self.write_ns = 0
+
+    def invalidate(self):
+        """Forget the painted frame, e.g. after something else cleared the screen."""
+        self.prev_header = None
+        self.prev_grid = None
+
+    def paint(self, header, grid):
+        """Write the cursor moves and glyphs needed to turn the old frame into this one."""
+        out = []
+        # A resized camera window (rows or row width) is painted in full
+        if (self.prev_grid is None or len(header) != len(self.prev_header)
+                or len(grid) != len(self.prev_grid)
+                or (grid and len(grid[0]) != len(self.prev_grid[0]))):
+            # Absolute painting without newlines to avoid terminal scrolling
+            out.append(CURSOR_HOME_CODE)
+            lines = [line.encode() for line in header] + [encode_cells(row) for row in grid]
+            for i, line in enumerate(lines, start=1):
+                out.append(GOTO_CODE % (i, 1))
+                out.append(line)
+                out.append(ERASE_LINE_CODE)
+            out.append(GOTO_CODE % (len(lines) + 1, 1))
+            out.append(ERASE_DOWN_CODE)
+        else:
+            for i, (line, old) in enumerate(zip(header, self.prev_header), start=1):
+                if line != old:
+                    out.append(GOTO_CODE % (i, 1) + line.encode() + ERASE_LINE_CODE)
+
+            # Map cell (y, x) sits at screen row top+y, column 2x+1 (space-separated).
+            top = len(header) + 1
+            for y, (row, old) in enumerate(zip(grid, self.prev_grid)):
+                if row == old: continue
+                x, w = 0, len(row)
+                while x < w:
+                    if row[x] == old[x]:
+                        x += 1
+                        continue
+                    start = x
+                    while x < w and row[x] != old[x]:
+                        x += 1
+                    out.append(GOTO_CODE % (top + y, 2 * start + 1))
+                    out.append(encode_cells(row[start:x]))
+
+        self.prev_header = header
+        self.prev_grid = grid
+        if self.profiler: self.profiler.mark('render')
+        t0 = time.perf_counter_ns()
+        if out:
+            write_frame(b"".join(out))
+        self.write_ns = time.perf_counter_ns() - t0
+        if self.profiler: self.profiler.mark('flush')
+
+
+class RenderThread:
+    """Paints frames on a background thread so a slow terminal never holds up
+    the tick. paint() only publishes the frame into a one-slot back buffer;
+    the thread takes the newest one whenever its previous paint is done, so
+    frames published in the meantime are skipped (counted in `skipped`)
+    rather than queued. compose_frame builds new lists every frame and nothing
+    changes them afterwards, so frames are shared without copying. An error
+    raised while painting stops the thread and is raised again by the next
+    paint() or stop(); stop() paints a frame still waiting first.
+    """
+
+    def __init__(self, renderer, profiler=None):
+        self.renderer = renderer
+        self.profiler = profiler
+        self.painted = self.skipped = 0
+        self._back = None           # newest frame not yet taken by the thread
+        self._busy = False
+        self._stopping = False
+        self._error = None          # exception that ended the thread
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="renderer", daemon=True)
+        self._thread.start()
+
+    def paint(self, header, grid):
+        self._raise_error()
+        with self._cond:
+            if self._back is not None:
+                self.skipped += 1
+            self._back = (header, grid)
+            self._cond.notify()
+        if self.profiler: self.profiler.mark('render')
+
+    def wait_idle(self):
+        """Drop the frame waiting to be painted and wait out the one being
+        painted, so the caller can write to the terminal itself."""
+        with self._cond:
+            if self._back is not None:
+                self._back = None
+                self.skipped += 1
+            while self._busy:
+                self._cond.wait()
+
+    def invalidate(self):
+        self.wait_idle()
+        self.renderer.invalidate()
+
+    def stop(self):
+        """Paint the frame still waiting, if any, and end the thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _run(self):
+        cond = self._cond
+        while True:
+            with cond:
+                while self._back is None and not self._stopping:
+                    cond.wait()
+                if self._back is None:
+                    return          # stopping, with nothing left to paint
+                frame, self._back = self._back, None
+                self._busy = True
+            try:
+                t0 = time.perf_counter_ns()
+                self.renderer.paint(*frame)
+                self.painted += 1
+                if self.profiler:
+                    write_ns = self.renderer.write_ns
+                    self.profiler.thread_frame(time.perf_counter_ns() - t0 - write_ns, write_ns)
+            except BaseException as e:
+                self._error = e
+                return
+            finally:
+                with cond:
+                    self._busy = False
+                    cond.notify_all()
+
+
+def print_map(game, renderer, camera=None, cast=None):
+    """Compose the frame and paint it via absolute cursor addressing (no scrolling),
+    sending only the cells and header lines that changed since the last paint.
+    `renderer` is a DiffRenderer, or a RenderThread that paints it later.
+    With a CastWriter the frame is also queued for the session cast.
+    """
+    header, grid = compose_frame(game, camera)
+    renderer.paint(header, grid)
+    if cast: cast.capture(header, grid)
 
 
 def pause_and_countdown():
@@ -384,51 +2060,52 @@ def pause_and_countdown():
 
 
 def show_start_screen():
-    """Simple start page on the normal console buffer, with a short game intro."""
-    clear_screen()
-    print("============== MOUSE KNIGHT'S SURVIVAL ADVENTURE ==============")
-    print("Move: WASD   Attack: IJKL   Pause: P   Quit: Q")
-    print()
-
-    # Short goal/introduction (concise English)
-    print("Your Goal: Survive in this strange land. Slash the monsters, grab helpful items,and stay alive as long as you can.")
-    print()
-
+    """Simple start page on the normal console buffer, with a short game intro,
+    written in one go. The caller waits for the key, so it can build the game
+    while the page is up."""
     # Legends: use the same colors as in the game for consistency
     sym = colorize_char  # alias for brevity
 
-    print("Entities:")
-    print(f"  {sym('@')}  You — the brave mouse knight.")
-    print(f"  {sym('^')}  Thorn Beast — hurts you when you get next to it, keep your distance.")
-    print(f"  {sym('%')}  Giant Spider — wanders randomly, don't run into it.")
-    print(f"  {sym('&')}  Zombie — follows your scent, slow but persistent.")
-    print(f"  {sym('$')}  Skeleton — shoots arrows, dodge them or swat them with your sword.")
-    print()
-
-    print("Magic Items:")
-    print(f"  {sym('H')}  Healing Potion — restore some HP.")
-    print(f"  {sym('S')}  Strength Potion — your sword becomes super long for a short time.")
-    print(f"  {sym('D')}  Defense Potion — briefly ignore incoming damage.")
-    print(f"  {sym('M')}  Magic Potion — auto-cast shots at nearby enemies.")
-    print()
-
-    print("Press any key to start...")
-    wait_any_key_blocking()
+    lines = [
+        "============== MOUSE KNIGHT'S SURVIVAL ADVENTURE ==============",
+        "Move: WASD   Attack: IJKL   Pause: P   Quit: Q",
+        "",
+        # Short goal/introduction (concise English)
+        "Your Goal: Survive in this strange land. Slash the monsters, grab helpful items,and stay alive as long as you can.",
+        "",
+        "Entities:",
+        f"  {sym('@')}  You — the brave mouse knight.",
+        f"  {sym('^')}  Thorn Beast — hurts you when you get next to it, keep your distance.",
+        f"  {sym('%')}  Giant Spider — wanders randomly, don't run into it.",
+        f"  {sym('&')}  Zombie — follows your scent, slow but persistent.",
+        f"  {sym('$')}  Skeleton — shoots arrows, dodge them or swat them with your sword.",
+        "",
+        "Magic Items:",
+        f"  {sym('H')}  Healing Potion — restore some HP.",
+        f"  {sym('S')}  Strength Potion — your sword becomes super long for a short time.",
+        f"  {sym('D')}  Defense Potion — briefly ignore incoming damage.",
+        f"  {sym('M')}  Magic Potion — auto-cast shots at nearby enemies.",
+        "",
+        "Press any key to start...",
+    ]
+    sys.stdout.write(CURSOR_HOME + ERASE_DOWN + "\n".join(lines) + "\n")
+    sys.stdout.flush()
 
 
-def show_game_over():
+def show_game_over(game):
     """Game over page: full clear once (on alt buffer), then restore console.
     Added: small delay before showing, and wait for any key to continue.
     """
 
     clear_screen()
     print("Game Over!")
-    survived_secs = int(time.time() - start_time)
-    print(f"Time: {survived_secs} s    Kills: {kill_count}    Final Score: {score}")
+    survived_secs = int(game.elapsed)
+    print(f"Time: {survived_secs} s    Kills: {game.kill_count}    Final Score: {game.score}")
 
     time.sleep(1.5)
-    if have_msvcrt:
-        while msvcrt.kbhit(): _ = msvcrt.getch()
+    # Keys pressed while dying or during the delay must not skip the summary
+    if key_reader is not None or have_msvcrt:
+        _flush_pending_keys()
     else: time.sleep(0.1)
 
     print("Press any key to continue...")
@@ -439,138 +2116,919 @@ def show_game_over():
 
 
 
-# --- Utility Functions --------------------------------------------------------
-def spawn_obstacles():
-    """Generate interior obstacles according to density."""
-    obstacle_set = set()
-    area = (WIDTH - 2) * (HEIGHT - 2)
-    target_count = int(area * OBSTACLE_DENSITY)
-    while len(obstacle_set) < target_count:
-        r, c = random_location()
-        if (r, c) != (player.row, player.col):
-            obstacle_set.add((r, c))
-    return obstacle_set
+# --- Timing -------------------------------------------------------------------
+# perf_counter readings at each startup milestone, for startup_report()
+startup_marks = {}
 
 
-def spawn_monster():
-    """Propose a new monster at a free interior cell, with weights."""
-    types = list(monster_stats.keys())
-    weights = [monster_stats[t].get('weight', 1) for t in types]
-    mtype = random.choices(types, weights=weights, k=1)[0]
+def mark_startup(name):
+    """Record the first time `name` is reached."""
+    startup_marks.setdefault(name, time.perf_counter())
 
-    for _ in range(100):
-        r, c = random_location()
-        if is_location_empty(r, c):
-            return Monster(mtype, r, c)
-    return None
 
-def kill_monster(monster):
-    death_marks.append({'row': monster.row, 'col': monster.col, 'timer': DEATH_MARK_DURATION})
-    monsters.remove(monster)
+def startup_report():
+    """One line of startup milestones in ms since STARTUP_T0. Time spent
+    waiting on the start page's key is not counted towards the first frame."""
+    marks = startup_marks
+    if 'first frame' not in marks:
+        return "Startup: no frame drawn"
+    waited = marks.get('key pressed', 0) - marks.get('game ready', 0)
+    parts = [f"{name} {(marks[name] - STARTUP_T0) * 1000:.1f} ms"
+             for name in ('imported', 'start page', 'game ready') if name in marks]
+    parts.append(f"first frame {(marks['first frame'] - STARTUP_T0 - waited) * 1000:.1f} ms")
+    return "Startup: " + ", ".join(parts) + f" (plus {waited:.1f} s on the start page)"
 
 
-def spawn_item():
-    """Propose a new item at a free interior cell (random type)."""
-    itype = random.choice(['H', 'S', 'M', 'D'])
-    for _ in range(100):
-        r, c = random_location()
-        if is_location_empty(r, c):
-            return Item(itype, r, c)
-    return None
+class FixedStepClock:
+    """Fixed-timestep accumulator on a monotonic clock. The simulation advances
+    in whole ticks of `interval` seconds regardless of how often input arrives;
+    backlog beyond `max_catchup` ticks is dropped instead of replayed.
+    """
+
+    def __init__(self, interval=FRAME_INTERVAL_SEC, max_catchup=MAX_CATCHUP_TICKS):
+        self.interval = interval
+        self.max_catchup = max_catchup
+        self.dropped = 0
+        self.reset()
+
+    def reset(self):
+        """Restart timing from now (after a pause nothing is owed)."""
+        self.last = time.perf_counter()
+        self.accumulator = 0.0
+
+    def due_ticks(self):
+        """Return how many ticks to run now."""
+        now = time.perf_counter()
+        self.accumulator += now - self.last
+        self.last = now
+        ticks = int(self.accumulator / self.interval)
+        self.accumulator -= ticks * self.interval
+        if ticks > self.max_catchup:
+            self.dropped += ticks - self.max_catchup
+            ticks = self.max_catchup
+        return ticks
+
+    def time_to_next(self):
+        """Seconds until the next tick is due."""
+        return max(0.0, self.interval - self.accumulator - (time.perf_counter() - self.last))
+# ------------------------------------------------------------------------------
+
+
+
+# --- Profiling ----------------------------------------------------------------
+# Upper bounds (ms) of the frame-time histogram buckets; the last bucket is open-ended
+FRAME_HISTOGRAM_MS = (0.5, 1, 2, 4, 8, 12, 16, 33)
+
+
+def _no_mark(phase):
+    pass
+
+
+class FrameProfiler:
+    """Opt-in per-phase frame timing. mark(phase) charges the time since the
+    previous mark to `phase`; end_frame() closes the frame, feeds the histogram
+    and, once a second, refreshes the `hud` text shown beside "Status:".
+    key_applied() records input latency: from a key's timestamp to the tick
+    that applies it. With the render thread, the tick's 'render' phase only
+    hands the frame over; thread_frame() charges the diffing ('paint') and
+    the terminal write ('flush') of each frame that thread paints.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.histogram = [0] * (len(FRAME_HISTOGRAM_MS) + 1)
+        self.phase_ns = {}          # whole run, per phase
+        self.current = {}           # this frame, per phase
+        self.hud = "fps -  tick - ms"
+        now = time.perf_counter_ns()
+        self._frame_start = self._last = now
+        self._window_start = now
+        self._window_frames = 0
+        self._window_ns = 0
+        self._window_phase_ns = {}
+        self.keys = 0
+        self.key_latency_max = self._key_latency_sum = 0.0
+        self._window_keys = 0
+        self._window_key_latency = 0.0
+        self.thread_frames = 0
+        self.thread_ns = {'paint': 0, 'flush': 0}       # render thread, whole run
+        self._thread_lock = threading.Lock()
+        self._window_thread_frames = 0
+        self._window_thread_ns = {'paint': 0, 'flush': 0}
+
+    def thread_frame(self, paint_ns, flush_ns):
+        """Charge one frame painted on the render thread (called from that thread)."""
+        with self._thread_lock:
+            self.thread_frames += 1
+            self._window_thread_frames += 1
+            for totals in (self.thread_ns, self._window_thread_ns):
+                totals['paint'] += paint_ns
+                totals['flush'] += flush_ns
+
+    def key_applied(self, latency):
+        """A key is being applied `latency` seconds after it was pressed."""
+        self.keys += 1
+        self._key_latency_sum += latency
+        self.key_latency_max = max(self.key_latency_max, latency)
+        self._window_keys += 1
+        self._window_key_latency += latency
+
+    def start_frame(self):
+        self._frame_start = self._last = time.perf_counter_ns()
+        self.current = {}
+
+    def mark(self, phase):
+        now = time.perf_counter_ns()
+        self.current[phase] = self.current.get(phase, 0) + now - self._last
+        self._last = now
+
+    def end_frame(self):
+        frame_ns = self._last - self._frame_start
+        frame_ms = frame_ns / 1e6
+        bucket = 0
+        while bucket < len(FRAME_HISTOGRAM_MS) and frame_ms > FRAME_HISTOGRAM_MS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+        self.frames += 1
+
+        self._window_frames += 1
+        self._window_ns += frame_ns
+        for phase, ns in self.current.items():
+            self.phase_ns[phase] = self.phase_ns.get(phase, 0) + ns
+            self._window_phase_ns[phase] = self._window_phase_ns.get(phase, 0) + ns
+
+        if self._last - self._window_start >= 1_000_000_000:
+            n = self._window_frames
+            fps = n * 1e9 / (self._last - self._window_start)
+            slowest = max(self._window_phase_ns, key=self._window_phase_ns.get)
+            self.hud = (f"fps {fps:.0f}  tick {self._window_ns / n / 1e6:.2f} ms  "
+                        f"slowest {slowest} {self._window_phase_ns[slowest] / n / 1e6:.2f} ms")
+            with self._thread_lock:
+                painted, thread_ns = self._window_thread_frames, self._window_thread_ns
+                self._window_thread_frames, self._window_thread_ns = 0, {'paint': 0, 'flush': 0}
+            if painted:
+                self.hud += (f"  paint {thread_ns['paint'] / painted / 1e6:.2f}"
+                             f" flush {thread_ns['flush'] / painted / 1e6:.2f} ms")
+            if self._window_keys:
+                self.hud += f"  key {self._window_key_latency / self._window_keys * 1e3:.1f} ms"
+            self._window_start = self._last
+            self._window_frames = self._window_ns = 0
+            self._window_phase_ns = {}
+            self._window_keys, self._window_key_latency = 0, 0.0
+
+    def report(self):
+        """Multi-line summary: mean time per phase and the frame-time histogram."""
+        if not self.frames:
+            return "No frames profiled."
+        lines = [f"Profiled {self.frames} frames", "Mean per frame:"]
+        for phase, ns in sorted(self.phase_ns.items(), key=lambda kv: -kv[1]):
+            lines.append(f"  {phase:<12}{ns / self.frames / 1e6:8.3f} ms")
+        lines.append("Frame time histogram:")
+        peak = max(self.histogram)
+        low = 0
+        for i, count in enumerate(self.histogram):
+            label = (f"{low:>5}-{FRAME_HISTOGRAM_MS[i]:<3} ms" if i < len(FRAME_HISTOGRAM_MS)
+                     else f"{low:>5}+    ms")
+            bar = '#' * round(40 * count / peak) if peak else ''
+            lines.append(f"  {label} {count:>7} {bar}")
+            if i < len(FRAME_HISTOGRAM_MS): low = FRAME_HISTOGRAM_MS[i]
+        if self.thread_frames:
+            lines.append(f"Render thread, mean per painted frame ({self.thread_frames} painted):")
+            for phase, ns in self.thread_ns.items():
+                lines.append(f"  {phase:<12}{ns / self.thread_frames / 1e6:8.3f} ms")
+        if self.keys:
+            lines.append(f"Key to tick: mean {self._key_latency_sum / self.keys * 1e3:.1f} ms, "
+                         f"max {self.key_latency_max * 1e3:.1f} ms over {self.keys} keys")
+        return "\n".join(lines)
+# ------------------------------------------------------------------------------
+
+
+
+# --- Recording & Replay -------------------------------------------------------
+RECORDING_MAGIC = b'MKRC'
+# Version 4: monster timers fire in monster-list order; version 5: buffs end
+# on the tick the pre-wheel countdowns did. Older recordings would diverge.
+RECORDING_VERSION = 5
+# magic, version, flags, seed, map height, map width, ticks, events, hash interval, hashes
+RECORDING_HEADER = struct.Struct('<4sBBQIIIIHI')
+RECORDING_FOG = 1
+HASH_INTERVAL = 64
+SEED_LIMIT = 1 << 64        # recordings and snapshots store the seed as an unsigned 64-bit int
 
 
-def apply_item_effect(t):
-    """Apply item effect and timers."""
-    if t == 'H':
-        player.hp = min(player.max_hp, player.hp + 25)
-    elif t == 'S':
-        player.length = 10
-        player.strength_timer = 600
-    elif t == 'M':
-        player.magic_cooldown = 0
-        player.magic_timer = 800
-    elif t == 'D':
-        player.shield_timer = 500
-
-
-def process_player_action(key):
-    """Handle movement and melee attack (IJKL), with obstacle blocking."""
-    global sword_effect_cells, kill_count, score
-    sword_effect_cells = []
-
-    # Movement
-    if key == 'w':
-        nr, nc = player.row - 1, player.col
-    elif key == 's':
-        nr, nc = player.row + 1, player.col
-    elif key == 'a':
-        nr, nc = player.row, player.col - 1
-    elif key == 'd':
-        nr, nc = player.row, player.col + 1
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+class Recording:
+    """Seed plus the key pressed on each tick, stored as (varint tick delta, key byte)
+    pairs. A running state hash is saved every HASH_INTERVAL ticks (and after the
+    last tick) so a replay can tell where it diverged.
+    """
+
+    def __init__(self, seed, fog=False):
+        # Checked up front, not when the file is written after the whole run
+        if not 0 <= seed < SEED_LIMIT:
+            raise ValueError(f"seed {seed} can't be recorded: it must be from 0 to 2**64 - 1")
+        self.seed = seed
+        self.fog = fog
+        self.height, self.width = HEIGHT, WIDTH
+        self.ticks = 0
+        self.events = []       # (tick, key)
+        self.hashes = []       # running state hash at each checkpoint
+        self._running_hash = 0
+
+    def record_tick(self, game, key):
+        """Call after game.step(key) for every tick of the run."""
+        if key:
+            self.events.append((self.ticks, key))
+        self.ticks += 1
+        self._running_hash = game.state_hash(self._running_hash)
+        if self.ticks % HASH_INTERVAL == 0:
+            self.hashes.append(self._running_hash)
+
+    def to_bytes(self):
+        hashes = list(self.hashes)
+        if self.ticks % HASH_INTERVAL:
+            hashes.append(self._running_hash)
+        out = bytearray(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION,
+                                              RECORDING_FOG if self.fog else 0, self.seed,
+                                              self.height, self.width, self.ticks, len(self.events),
+                                              HASH_INTERVAL, len(hashes)))
+        last = 0
+        for tick, key in self.events:
+            _write_varint(out, tick - last)
+            out.append(ord(key))
+            last = tick
+        out += struct.pack(f'<{len(hashes)}I', *hashes)
+        return bytes(out)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] == RECORDING_MAGIC and 0 < data[4] < RECORDING_VERSION:
+            raise ValueError(f"{path} is a version {data[4]} recording from an older game "
+                             f"and cannot be replayed by this one (version {RECORDING_VERSION})")
+        magic, version, flags, seed, height, width, ticks, n_events, interval, n_hashes = \
+            RECORDING_HEADER.unpack_from(data)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError(f"{path} is not a version {RECORDING_VERSION} recording")
+        rec = cls(seed, bool(flags & RECORDING_FOG))
+        rec.height, rec.width = height, width
+        rec.ticks = ticks
+        pos, tick = RECORDING_HEADER.size, 0
+        for _ in range(n_events):
+            delta, pos = _read_varint(data, pos)
+            tick += delta
+            rec.events.append((tick, chr(data[pos])))
+            pos += 1
+        rec.hashes = list(struct.unpack_from(f'<{n_hashes}I', data, pos))
+        rec.hash_interval = interval
+        return rec
+
+
+def replay_recording(path, game_cls=None):
+    """Re-run a recording headless as fast as possible, checking the state hash.
+    Returns (game, first_bad_tick); first_bad_tick is None when the replay matched.
+    A mismatch is reported at the checkpoint that caught it.
+    """
+    rec = Recording.load(path)
+    if (rec.height, rec.width) != (HEIGHT, WIDTH):
+        raise ValueError(f"{path} was recorded on a {rec.width}x{rec.height} map; "
+                         f"replay it with --width {rec.width} --height {rec.height}")
+    game = (game_cls or Game)(seed=rec.seed, fog=rec.fog)
+    keys = dict(rec.events)
+    interval = rec.hash_interval
+    running = 0
+    checkpoints = iter(rec.hashes)
+    for tick in range(rec.ticks):
+        game.step(keys.get(tick), FRAME_INTERVAL_SEC)
+        running = game.state_hash(running)
+        if (tick + 1) % interval == 0 or tick + 1 == rec.ticks:
+            if next(checkpoints, None) != running:
+                return game, tick
+    return game, None
+# ------------------------------------------------------------------------------
+
+
+
+# --- Snapshots ----------------------------------------------------------------
+# A snapshot is a fixed header, three fixed-size structs and then nothing but
+# little-endian int32 sections whose lengths the header gives, so loading is
+# a memory map plus slicing: no field is parsed on its own.
+SNAPSHOT_MAGIC = b'MKSN'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ARRAY_MONSTERS = 1     # flag: written by a game with array-backed monsters
+SNAPSHOT_FOG = 2                # flag: fog-of-war game
+
+# int32 sections in file order, with the number of ints per record
+SNAPSHOT_SECTIONS = (
+    ('obstacles', 1),       # flat cell id
+    ('monsters', 10),       # MONSTER_RECORD
+    ('monster_order', 1),   # bucket order (Game) or slot (array store) of each monster
+    ('monster_free', 1),    # an array store's free slots, in pop order
+    ('bullets', 13),        # row col dr dc damage from_player dx dy sx sy err has_target next_move
+    ('bullet_order', 1),    # bullet indices, cell stack by cell stack
+    ('items', 3),           # type (as its character code) row col
+    ('warnings', 5),        # row col phase due monster_type
+    ('death_marks', 3),     # row col expires
+    ('damage', 2),          # monster type, damage dealt
+    ('timers', 6),          # wheel level (or overflow, due), slot, tick, kind, entity index, arg
+    ('free_cells', 1),      # CellSet members in their current order
+    ('walkable_cells', 1),
+)
+# ...followed by the free and walkable CellSet pos arrays, height * width ints each
+
+# magic, version, flags, map height, map width, seed, array store capacity, section lengths
+SNAPSHOT_HEADER = struct.Struct(f'<4sBBxxIIQI{len(SNAPSHOT_SECTIONS)}I')
+# frame_count, score, kill_count, monster_cap, spawn_timer, item_spawn_timer, base and
+# min spawn interval, obstacle_version, timer wheel tick, elapsed, score_clock
+SNAPSHOT_SCALARS = struct.Struct('<10i2d')
+# row, col, max_hp, hp, base_attack, attack, length, strength/magic/shield deadlines, magic_ready
+SNAPSHOT_PLAYER = struct.Struct('<11i')
+# Mersenne Twister words, gauss_next and whether it is set, then a NumPy PCG64
+# generator's state, increment, has_uint32 and uinteger
+SNAPSHOT_RNG = struct.Struct('<625IdI16s16sII')
+
+MONSTER_RECORD = ('row', 'col', 'type', 'hp', 'age', 'lifespan', 'frame_since_action',
+                  'target_row', 'target_col', 'bullet_timer')
+SNAPSHOT_MONSTER_WIDTH = len(MONSTER_RECORD)
+
+# Timer callbacks by kind number, and the phase each fires in
+TIMER_KINDS = (('_expire_monster', 'monster expiry'), ('_monster_shoot', 'monster shot'),
+               ('_monster_act', 'monster action'), ('_step_bullet', 'bullets'),
+               ('_expire_death_mark', 'death marks'), ('_advance_warning', 'warnings'),
+               ('_end_strength', 'buffs'), ('auto_magic_shoot', 'buffs'))
+
+
+def _nullable(v):
+    return -1 if v is None else v
+
+
+def _int_array(view):
+    """array('i') copy of an int32 memoryview, in one block copy."""
+    out = array('i')
+    out.frombytes(view.cast('B'))
+    return out
+
+
+def _timer_records(game, monsters, bullets, warnings, death_marks):
+    """The wheel's pending entries in slot order, with entities as list indices.
+    Timers of dead monsters and removed bullets would never do anything, so
+    they are left out."""
+    cls = type(game)
+    kinds = {getattr(cls, name): k for k, (name, _) in enumerate(TIMER_KINDS)}
+    refs = [{id(m): i for i, m in enumerate(monsters)}] * 3 + [
+        {id(b): i for i, b in enumerate(bullets)},
+        {id(dm): i for i, dm in enumerate(death_marks)},
+        {id(w): i for i, w in enumerate(warnings)}]
+    wheel = game.timers
+    places = [(level, slot, entries) for level, slots in enumerate(wheel.levels)
+              for slot, entries in enumerate(slots) if entries]
+    places.append((len(wheel.levels), 0, wheel.overflow))
+    places += [(len(wheel.levels) + 1, 0, entries) for entries in wheel.due.values()]
+    out = array('i')
+    for where, slot, entries in places:
+        for tick, _, fn, args in entries:
+            kind = kinds[fn.__func__]
+            index = arg = 0
+            if kind < 6:
+                index = refs[kind].get(id(args[0]))
+                if index is None: continue
+                if kind == 3 and args[1] != args[0].gen: continue
+            elif kind == 7:
+                arg = args[0]
+            out.extend((where, slot, tick, kind, index, arg))
+    return out
+
+
+def snapshot_bytes(game):
+    """Serialize the whole game state, taken between ticks, to the snapshot layout."""
+    if not 0 <= game.seed < SEED_LIMIT:
+        raise ValueError(f"seed {game.seed} can't be saved: it must be from 0 to 2**64 - 1")
+    game.compact_entities()
+    game._sync_cells()
+    p = game.player
+    bullets, warnings, death_marks = list(game.bullets), list(game.spawn_warnings), list(game.death_marks)
+    monster_records, monster_order, monster_free, capacity = game._monster_snapshot()
+    bullet_index = {id(b): i for i, b in enumerate(bullets)}
+
+    sections = {
+        'obstacles': array('i', sorted(r * WIDTH + c for r, c in game.obstacle_set)),
+        'monsters': monster_records,
+        'monster_order': monster_order,
+        'monster_free': monster_free,
+        'bullets': array('i', [v for b in bullets for v in (
+            b.row, b.col, b.dr, b.dc, b.damage, b.from_player, b.dx, b.dy,
+            b.sx, b.sy, b.err, b.has_target, _nullable(b.next_move))]),
+        'bullet_order': array('i', [bullet_index[id(b)] for stack in game.bullets_at.values() for b in stack]),
+        'items': array('i', [v for it in game.items for v in (ord(it.type), it.row, it.col)]),
+        'warnings': array('i', [v for w in warnings for v in (
+            w['row'], w['col'], w['phase'], w['due'], w['monster'].type)]),
+        'death_marks': array('i', [v for dm in death_marks for v in (dm['row'], dm['col'], dm['expires'])]),
+        'damage': array('i', [v for item in game.damage_taken.items() for v in item]),
+        'timers': _timer_records(game, list(game.monsters), bullets, warnings, death_marks),
+        'free_cells': game.free_cells.cells,
+        'walkable_cells': game.walkable_cells.cells,
+    }
+    lengths = [len(memoryview(sections[name]).cast('B')) // (4 * width) for name, width in SNAPSHOT_SECTIONS]
+
+    flags = game.snapshot_flags | (SNAPSHOT_FOG if game.fov else 0)
+    out = bytearray(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags,
+                                         HEIGHT, WIDTH, game.seed, capacity, *lengths))
+    out += SNAPSHOT_SCALARS.pack(game.frame_count, game.score, game.kill_count, game.monster_cap,
+                                 game.spawn_timer, game.item_spawn_timer, game.base_spawn_interval,
+                                 game.min_spawn_interval, game.obstacle_version, game.timers.now,
+                                 game.elapsed, game.score_clock)
+    out += SNAPSHOT_PLAYER.pack(p.row, p.col, p.max_hp, p.hp, p.base_attack, p.attack, p.length,
+                                p.strength_until, p.magic_until, p.shield_until, p.magic_ready)
+    out += SNAPSHOT_RNG.pack(*game._rng_snapshot())
+    for name, _ in SNAPSHOT_SECTIONS:
+        out += sections[name]
+    out += game.free_cells.pos
+    out += game.walkable_cells.pos
+    return bytes(out)
+
+
+def save_snapshot(game, path):
+    with open(path, 'wb') as f:
+        f.write(snapshot_bytes(game))
+
+
+def _snapshot_header(data, total):
+    """Unpack and check the header at the start of `data`, for a snapshot
+    `total` bytes long. Returns (flags, height, width, seed, capacity, section
+    lengths, snapshot size); raises ValueError for anything that is not a
+    whole snapshot."""
+    if len(data) < SNAPSHOT_HEADER.size:
+        raise ValueError("not a snapshot (too short)")
+    magic, version, flags, height, width, seed, capacity, *lengths = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError(f"not a version {SNAPSHOT_VERSION} snapshot")
+    size = (SNAPSHOT_HEADER.size + SNAPSHOT_SCALARS.size + SNAPSHOT_PLAYER.size + SNAPSHOT_RNG.size
+            + 4 * (sum(n * w for (_, w), n in zip(SNAPSHOT_SECTIONS, lengths)) + 2 * height * width))
+    if total < size:
+        raise ValueError(f"truncated snapshot: {total} of {size} bytes")
+    return flags, height, width, seed, capacity, lengths, size
+
+
+def snapshot_map_size(path):
+    """(height, width) of the map a snapshot file was saved with, after the
+    same checks restore_snapshot makes of its header."""
+    with open(path, 'rb') as f:
+        header = f.read(SNAPSHOT_HEADER.size)
+        return _snapshot_header(header, os.fstat(f.fileno()).st_size)[1:3]
+
+
+def restore_snapshot(data, game_cls=None):
+    """Build a game from snapshot bytes (or any buffer, such as an mmap).
+    game_cls defaults to the kind of game that wrote the snapshot."""
+    # Validate against the header before taking any memoryview: a view still
+    # alive in a traceback would stop load_snapshot from closing its mmap
+    flags, height, width, seed, capacity, lengths, size = _snapshot_header(data, len(data))
+    if (height, width) != (HEIGHT, WIDTH):
+        raise ValueError(f"snapshot is of a {width}x{height} map; "
+                         f"load it with --width {width} --height {height}")
+    view = memoryview(data)
+    if game_cls is None:
+        if flags & SNAPSHOT_ARRAY_MONSTERS:
+            from horde import HordeGame as game_cls
+        else:
+            game_cls = Game
+    pos = SNAPSHOT_HEADER.size
+    scalars = SNAPSHOT_SCALARS.unpack_from(view, pos);  pos += SNAPSHOT_SCALARS.size
+    player = SNAPSHOT_PLAYER.unpack_from(view, pos);    pos += SNAPSHOT_PLAYER.size
+    rng = SNAPSHOT_RNG.unpack_from(view, pos);          pos += SNAPSHOT_RNG.size
+    ints = view[pos:size].cast('i')
+    sections, at = {}, 0
+    for (name, w), n in zip(SNAPSHOT_SECTIONS, lengths):
+        sections[name] = ints[at:at + n * w]
+        at += n * w
+    area = height * width
+    free_pos, walkable_pos = ints[at:at + area], ints[at + area:at + 2 * area]
+
+    obstacles = [divmod(i, width) for i in sections['obstacles']]
+    game = game_cls(monster_cap=scalars[3], seed=seed, obstacles=obstacles, fog=bool(flags & SNAPSHOT_FOG))
+    (game.frame_count, game.score, game.kill_count, _, game.spawn_timer, game.item_spawn_timer,
+     game.base_spawn_interval, game.min_spawn_interval, game.obstacle_version, wheel_now,
+     game.elapsed, game.score_clock) = scalars
+    game.timers = TimerWheel(wheel_now)
+    p = game.player
+    (p.row, p.col, p.max_hp, p.hp, p.base_attack, p.attack, p.length,
+     p.strength_until, p.magic_until, p.shield_until, p.magic_ready) = player
+    game._restore_rng(rng)
+
+    exact = (flags & SNAPSHOT_ARRAY_MONSTERS) == game.snapshot_flags
+    monsters = game._restore_monsters(sections['monsters'], sections['monster_order'],
+                                      sections['monster_free'], capacity, exact)
+
+    bullets = []
+    for k in range(0, len(sections['bullets']), 13):
+        (row, col, dr, dc, damage, from_player, dx, dy, sx, sy, err, has_target,
+         next_move) = sections['bullets'][k:k + 13]
+        b = Bullet(row, col, dr, dc, damage, bool(from_player))
+        b.dx, b.dy, b.sx, b.sy, b.err = dx, dy, sx, sy, err
+        b.has_target = bool(has_target)
+        b.next_move = None if next_move < 0 else next_move
+        game.bullets.append(b)
+        bullets.append(b)
+    for k in sections['bullet_order']:
+        b = bullets[k]
+        game.bullets_at.setdefault((b.row, b.col), []).append(b)
+
+    rec = sections['items']
+    for k in range(0, len(rec), 3):
+        it = Item(chr(rec[k]), rec[k + 1], rec[k + 2])
+        game.items.append(it)
+        game.item_at[(it.row, it.col)] = it
+    rec, warnings = sections['warnings'], []
+    for k in range(0, len(rec), 5):
+        row, col, phase, due, mtype = rec[k:k + 5]
+        w = {'row': row, 'col': col, 'phase': phase, 'due': due, 'monster': Monster(mtype, row, col)}
+        game.spawn_warnings.append(w)
+        game.warning_at[(row, col)] = w
+        warnings.append(w)
+    rec, death_marks = sections['death_marks'], []
+    for k in range(0, len(rec), 3):
+        dm = {'row': rec[k], 'col': rec[k + 1], 'expires': rec[k + 2]}
+        game.death_marks.append(dm)
+        death_marks.append(dm)
+    rec = sections['damage']
+    game.damage_taken = {rec[k]: rec[k + 1] for k in range(0, len(rec), 2)}
+
+    game.free_cells = CellSet(_int_array(sections['free_cells']), _int_array(free_pos))
+    game.walkable_cells = CellSet(_int_array(sections['walkable_cells']), _int_array(walkable_pos))
+    game._cells_version = game.obstacle_version
+
+    wheel, levels = game.timers, len(game.timers.levels)
+    targets = [monsters] * 3 + [bullets, death_marks, warnings]
+    rec = sections['timers']
+    for k in range(0, len(rec), 6):
+        where, slot, tick, kind, index, arg = rec[k:k + 6]
+        name, phase = TIMER_KINDS[kind]
+        if kind < 3 and not (exact and monsters is not None):
+            continue        # array stores have no per-monster timers
+        if kind < 6:
+            target = targets[kind][index]
+            args = (target, target.gen) if kind == 3 else (target,)
+        else:
+            args = (arg,) if kind == 7 else ()
+        entry = (tick, phase, getattr(game, name), args)
+        if where < levels:
+            wheel.levels[where][slot].append(entry)
+        elif where == levels:
+            wheel.overflow.append(entry)
+        else:
+            wheel.due.setdefault(phase, []).append(entry)
+    return game
+
+
+def load_snapshot(path, game_cls=None):
+    """Memory-map a snapshot file and restore the game it holds."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return restore_snapshot(mm, game_cls)
+# ------------------------------------------------------------------------------
+
+
+
+# --- Session Casts ------------------------------------------------------------
+# A cast holds every frame print_map painted, so a session can be watched later
+# without re-running it. After the file header come zlib blocks covering
+# CAST_BLOCK_SECONDS each. A block opens with a full frame and the rest are
+# deltas against the frame before, so seeking decodes a single block.
+CAST_MAGIC = b'MKCA'
+CAST_VERSION = 1
+CAST_HEADER = struct.Struct('<4sBxxxd')     # magic, version, unix time the cast was started
+CAST_BLOCK = struct.Struct('<IIII')         # compressed size, first frame's ms, frames, raw size
+CAST_FRAME = struct.Struct('<IBHH')         # ms since the first frame, kind, header lines, row spans
+CAST_LINE = struct.Struct('<HH')            # header line index, utf-8 length
+CAST_SPAN = struct.Struct('<HHH')           # grid row, first column, utf-8 length
+CAST_FULL, CAST_DELTA = 0, 1                # a full frame's spans are whole rows
+
+
+def _encode_frame(out, ms, header, rows, prev_header, prev_rows):
+    """Append a frame to `out`, in full or as the lines and row spans that
+    differ from the previous frame (prev_rows None forces a full frame)."""
+    full = (prev_rows is None or len(header) != len(prev_header) or len(rows) != len(prev_rows)
+            or (rows and len(rows[0]) != len(prev_rows[0])))
+    if full:
+        lines = list(enumerate(header))
+        spans = [(y, 0, row) for y, row in enumerate(rows)]
     else:
-        nr, nc = player.row, player.col
-
-    if key in ['w', 'a', 's', 'd']:
-        if is_location_valid(nr, nc) and not ((nr, nc) in obstacle_set):
-            collided = False
-            for m in monsters:
-                if (m.row, m.col) == (nr, nc):
-                    collided = True
-                    if m.type in (1, 2, 3):
-                        if player.shield_timer <= 0:
-                            player.hp -= m.atk
-                        kill_monster(m)
-                    break
-            if not collided:
-                for it in items:
-                    if (it.row, it.col) == (nr, nc):
-                        apply_item_effect(it.type)
-                        items.remove(it)
-                        break
-                player.row, player.col = nr, nc
-
-    # Attack
-    if key in ['i', 'j', 'k', 'l']:
-        if key == 'i':   dr, dc, sym = -1, 0, '|'
-        elif key == 'k': dr, dc, sym = 1,  0, '|'
-        elif key == 'j': dr, dc, sym = 0, -1, '-'
-        else:            dr, dc, sym = 0,  1, '-'
-        r, c = player.row, player.col
-        for step in range(1, player.length + 1):
-            tr, tc = r + dr * step, c + dc * step
-            if not is_location_valid(tr, tc): break
-            if (tr, tc) in obstacle_set: break
-            hit = False
-            for m in monsters:
-                if (m.row, m.col) == (tr, tc):
-                    m.hp -= player.attack
-                    if m.hp <= 0:
-                        kill_monster(m)
-                        kill_count += 1
-                        score += m.score
-                    hit = True
-                    break
-            if not hit:
-                for b in bullets:
-                    if (b.row, b.col) == (tr, tc):
-                        bullets.remove(b)
-                        break
-            sword_effect_cells.append((tr, tc, sym))
-
-
-def update_player_buffs():
-    """Tick down buff timers and auto-cast magic if active."""
-    if player.strength_timer > 0:
-        player.strength_timer -= 1
-        if player.strength_timer == 0:
-            player.length = PLAYER_WEAPON_LENGTH
-    if player.magic_timer > 0:
-        player.magic_timer -= 1
-        auto_magic_shoot()
-    if player.shield_timer > 0:
-        player.shield_timer -= 1
+        lines = [(i, line) for i, (line, old) in enumerate(zip(header, prev_header)) if line != old]
+        spans = []
+        for y, (row, old) in enumerate(zip(rows, prev_rows)):
+            if row == old: continue
+            start, end = 0, len(row)
+            while row[start] == old[start]: start += 1
+            while row[end - 1] == old[end - 1]: end -= 1
+            spans.append((y, start, row[start:end]))
+    out += CAST_FRAME.pack(ms, CAST_FULL if full else CAST_DELTA, len(lines), len(spans))
+    for i, line in lines:
+        data = line.encode()
+        out += CAST_LINE.pack(i, len(data))
+        out += data
+    for y, x, text in spans:
+        data = text.encode()
+        out += CAST_SPAN.pack(y, x, len(data))
+        out += data
+
+
+def _decode_block(raw, count):
+    """The (ms, header_lines, rows) frames of one decompressed block."""
+    frames, pos = [], 0
+    header = rows = None
+    for _ in range(count):
+        ms, kind, n_lines, n_spans = CAST_FRAME.unpack_from(raw, pos)
+        pos += CAST_FRAME.size
+        if kind == CAST_FULL:
+            header, rows = [''] * n_lines, [''] * n_spans
+        else:
+            header, rows = header[:], rows[:]
+        for _ in range(n_lines):
+            i, n = CAST_LINE.unpack_from(raw, pos)
+            pos += CAST_LINE.size
+            header[i] = raw[pos:pos + n].decode()
+            pos += n
+        for _ in range(n_spans):
+            y, x, n = CAST_SPAN.unpack_from(raw, pos)
+            pos += CAST_SPAN.size
+            text = raw[pos:pos + n].decode()
+            pos += n
+            rows[y] = rows[y][:x] + text + rows[y][x + len(text):]
+        frames.append((ms, header, rows))
+    return frames
+
+
+class CastWriter:
+    """Writes the frames handed to capture() to a cast file from a background
+    thread, so diffing, compression and disk writes stay off the tick.
+
+    capture() never blocks. When CAST_QUEUE_FRAMES frames are already waiting
+    for the writer, the new frame is dropped and counted in `dropped`. Each
+    frame is diffed against the last one written, so after a drop the cast
+    simply jumps ahead. Memory stays bounded by the queue plus one block.
+    """
+
+    def __init__(self, path, queue_frames=CAST_QUEUE_FRAMES):
+        self.path = path
+        self.frames = queue.Queue(queue_frames)
+        self.written = self.dropped = 0
+        self._file = None
+        self._thread = None
+
+    def start(self):
+        self._file = open(self.path, 'wb')
+        self._file.write(CAST_HEADER.pack(CAST_MAGIC, CAST_VERSION, time.time()))
+        self._thread = threading.Thread(target=self._run, name="cast-writer", daemon=True)
+        self._thread.start()
+
+    def capture(self, header, grid):
+        """Queue a composed frame. compose_frame builds fresh lists every
+        frame, so they are handed over without copying."""
+        try:
+            self.frames.put_nowait((time.perf_counter(), header, grid))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write out the frames still queued and close the file."""
+        if self._thread is None: return
+        while self._thread.is_alive():
+            try:
+                self.frames.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        t0 = prev_header = prev_rows = None
+        block, block_ms, block_frames = bytearray(), 0, 0
+        try:
+            while True:
+                item = self.frames.get()
+                if item is None: break
+                t, header, grid = item
+                if t0 is None: t0 = t
+                ms = int((t - t0) * 1000)
+                if block_frames and ms - block_ms >= CAST_BLOCK_SECONDS * 1000:
+                    self._write_block(block, block_ms, block_frames)
+                    block, block_frames = bytearray(), 0
+                if not block_frames:
+                    block_ms, prev_rows = ms, None
+                rows = [''.join(row) for row in grid]
+                _encode_frame(block, ms, header, rows, prev_header, prev_rows)
+                prev_header, prev_rows = header, rows
+                block_frames += 1
+                self.written += 1
+            if block_frames:
+                self._write_block(block, block_ms, block_frames)
+        finally:
+            self._file.close()
+
+    def _write_block(self, raw, ms, count):
+        data = zlib.compress(raw)
+        self._file.write(CAST_BLOCK.pack(len(data), ms, count, len(raw)))
+        self._file.write(data)
+        # Whole blocks reach the disk as they are done, so a crash loses at most one
+        self._file.flush()
+
+
+class Cast:
+    """A cast file opened for playback. The block index is read up front and
+    blocks are decoded when first needed (the last one decoded is kept)."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._data = data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.started = CAST_HEADER.unpack_from(data)
+        if magic != CAST_MAGIC or version != CAST_VERSION:
+            raise ValueError(f"{path} is not a version {CAST_VERSION} cast")
+        self.blocks = []        # (offset, compressed size, first frame's ms, frames, raw size)
+        pos = CAST_HEADER.size
+        while pos + CAST_BLOCK.size <= len(data):
+            size, ms, count, raw_size = CAST_BLOCK.unpack_from(data, pos)
+            pos += CAST_BLOCK.size
+            if pos + size > len(data):
+                break           # cut off mid-block: keep the whole ones
+            self.blocks.append((pos, size, ms, count, raw_size))
+            pos += size
+        self.block_ms = [b[2] for b in self.blocks]
+        self._cached = (None, None)
+
+    def frames(self, b):
+        """Decoded frames of block b."""
+        if self._cached[0] != b:
+            offset, size, _, count, _ = self.blocks[b]
+            self._cached = (b, _decode_block(zlib.decompress(self._data[offset:offset + size]), count))
+        return self._cached[1]
+
+    @property
+    def duration(self):
+        return self.frames(len(self.blocks) - 1)[-1][0] if self.blocks else 0
+
+    def locate(self, ms):
+        """(block, frame) on screen at `ms` into the cast."""
+        b = max(0, bisect.bisect_right(self.block_ms, ms) - 1)
+        frames = self.frames(b)
+        return b, max(0, bisect.bisect_right(frames, ms, key=lambda f: f[0]) - 1)
+
+    def step(self, b, i, n):
+        """(block, frame) n frames after (b, i), or before for negative n, stopping at the ends."""
+        i += n
+        while i < 0 and b > 0:
+            b -= 1
+            i += len(self.frames(b))
+        while i >= len(self.frames(b)) and b < len(self.blocks) - 1:
+            i -= len(self.frames(b))
+            b += 1
+        return b, min(max(i, 0), len(self.frames(b)) - 1)
+
+
+def _clock_text(ms):
+    s = int(ms // 1000)
+    return f"{s // 60:02d}:{s % 60:02d}"
+
+
+def play_cast(path):
+    """Watch a cast in the terminal: p pauses, a/d seek 5 s back/forward,
+    j/l step a frame (and pause), w/s double/halve the speed, q quits."""
+    cast = Cast(path)
+    if not cast.blocks:
+        print(f"{path} has no frames")
+        return
+    end = cast.duration
+    renderer = DiffRenderer()
+    sys.stdout.write(ALT_SCREEN_ON + HIDE_CURSOR + CURSOR_HOME)
+    sys.stdout.flush()
+
+    at, speed, paused = 0.0, 1.0, False
+    shown = None
+    last = time.perf_counter()
+    while True:
+        b, i = cast.locate(at)
+        for _, key in read_player_keys():
+            if key == 'q': return
+            if key == 'p': paused = not paused
+            elif key == 'a': at = max(0.0, at - 5000)
+            elif key == 'd': at = min(end, at + 5000)
+            elif key == 'w': speed = min(speed * 2, 64.0)
+            elif key == 's': speed = max(speed / 2, 1 / 16)
+            elif key in 'jl':
+                paused = True
+                b, i = cast.step(b, i, -1 if key == 'j' else 1)
+                at = cast.frames(b)[i][0]
+            b, i = cast.locate(at)
+
+        now = time.perf_counter()
+        if not paused:
+            at += (now - last) * 1000 * speed
+            if at >= end:
+                at, paused = end, True
+            b, i = cast.locate(at)
+        last = now
+
+        status = (f"Cast {_clock_text(at)} / {_clock_text(end)}  x{speed:g}{'  paused' if paused else ''}"
+                  f"    p pause  a/d -/+5 s  j/l frame  w/s speed  q quit")
+        if (b, i, status) != shown:
+            _, header, rows = cast.frames(b)[i]
+            renderer.paint(header + [status], rows)
+            shown = (b, i, status)
+        time.sleep(FRAME_INTERVAL_SEC)
+# ------------------------------------------------------------------------------
+
 
 
+# --- Input --------------------------------------------------------------------
+class TerminalKeyReader:
+    """Reads the TTY in cbreak mode on a background thread and pushes
+    (perf_counter timestamp, key) events onto a deque for the main loop to drain.
+    deque append/popleft are atomic, so producer and consumer never take a lock.
+    Escape sequences (arrow keys etc.) are swallowed rather than read as letters.
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.events = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._saved_attrs = None
+
+    def start(self):
+        self._saved_attrs = termios.tcgetattr(self.fd)
+        tty.setcbreak(self.fd)
+        self._thread = threading.Thread(target=self._run, name="key-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and put the terminal back the way we found it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._saved_attrs is not None:
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self._saved_attrs)
+
+    def _run(self):
+        in_escape = False
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self.fd], [], [], 0.05)
+            if not ready:
+                in_escape = False   # a lone ESC press
+                continue
+            data = os.read(self.fd, 64)
+            if not data:
+                break
+            now = time.perf_counter()
+            for byte in data:
+                if in_escape:
+                    # CSI/SS3 sequences end with a byte in 0x40..0x7e (after '[' / 'O')
+                    if byte not in (0x5b, 0x4f) and 0x40 <= byte <= 0x7e:
+                        in_escape = False
+                    continue
+                if byte == 0x1b:
+                    in_escape = True
+                    continue
+                self.events.append((now, chr(byte).lower()))
+            self._wake.set()
+
+    def drain(self):
+        """Return and remove every queued (timestamp, key) event, oldest first."""
+        out = []
+        while self.events:
+            out.append(self.events.popleft())
+        return out
+
+    def wait_key(self):
+        """Block until a key arrives and return it."""
+        while not self.events:
+            self._wake.wait(0.05)
+            self._wake.clear()
+        return self.events.popleft()[1]
+
+
+key_reader = None
 pause_key_down = False
 def get_player_input():
     """Return one of wasd/ijkl/p/q or None. 'p' is edge-triggered to avoid repeated pause."""
@@ -600,308 +3058,175 @@ def get_player_input():
     return None
 
 
-def update_monsters():
-    """Update monsters: lifespan, optional shooting, movement, and collisions."""
-    for m in monsters[:]:
-        m.age += 1
-        if m.age >= m.lifespan:
-            kill_monster(m)
-            continue
-
-        if m.bullet_timer is not None:
-            m.bullet_timer -= 1
-            if m.bullet_timer <= 0:
-                bullets.append(make_bullet_towards(m.row, m.col, player.row, player.col, m.atk, False))
-                m.bullet_timer = monster_stats[4]['bullet_cooldown']
-
-        if monster_should_act(m):
-            if m.type in (2, 4):  # random waypoint walker
-                if m.target_row is None or (m.row == m.target_row and m.col == m.target_col):
-                    for _ in range(50):
-                        tr, tc = random_location()
-                        if not ((tr, tc) in obstacle_set):
-                            m.target_row, m.target_col = tr, tc
-                            break
-                dr = (-1 if m.target_row < m.row else 1 if m.target_row > m.row else 0)
-                dc = (-1 if m.target_col < m.col else 1 if m.target_col > m.col else 0)
-                if dr != 0 and dc != 0:
-                    if random.random() < 0.5: dc = 0
-                    else: dr = 0
-                nr, nc = m.row + dr, m.col + dc
-                if not is_location_valid(nr, nc):
-                    m.target_row = None
-                elif (nr, nc) in obstacle_set:
-                    m.target_row = None
-                elif any(o is not m and (o.row, o.col) == (nr, nc) for o in monsters):
-                    m.target_row = None
-                elif (nr, nc) == (player.row, player.col):
-                    if player.shield_timer <= 0:
-                        player.hp -= m.atk
-                    if m.type == 2:
-                        kill_monster(m)
-                        continue
-                    m.target_row = None
-                else:
-                    m.row, m.col = nr, nc
-
-            elif m.type == 3:     # chaser
-                dr = (-1 if player.row < m.row else 1 if player.row > m.row else 0)
-                dc = (-1 if player.col < m.col else 1 if player.col > m.col else 0)
-                if dr != 0 and dc != 0: dc = 0
-                nr, nc = m.row + dr, m.col + dc
-                if not is_location_valid(nr, nc) or ((nr, nc) in obstacle_set):
-                    nr, nc = m.row, m.col
-                    if dr != 0 and dc == 0:
-                        nc = m.col + (-1 if player.col < m.col else 1 if player.col > m.col else 0)
-                    elif dc != 0 and dr == 0:
-                        nr = m.row + (-1 if player.row < m.row else 1 if player.row > m.row else 0)
-                if (nr, nc) != (m.row, m.col):
-                    if not any(o is not m and (o.row, o.col) == (nr, nc) for o in monsters):
-                        if (nr, nc) == (player.row, player.col):
-                            if player.shield_timer <= 0:
-                                player.hp -= m.atk
-                            if m.type in (1, 2, 3):
-                                kill_monster(m)
-                                continue
-                        else:
-                            m.row, m.col = nr, nc
-
-
-def static_monster_attack():
-    """Type-1 static monster triggers when player is adjacent, then disappears."""
-    for m in monsters[:]:
-        if m.type == 1:
-            if abs(m.row - player.row) <= 1 and abs(m.col - player.col) <= 1 and (m.row, m.col) != (player.row, player.col):
-                if player.shield_timer <= 0:
-                    player.hp -= m.atk
-                kill_monster(m)
-
-
-def update_bullets():
-    """Move bullets (Bresenham-like targeted steps) and resolve collisions."""
-    global kill_count, score
-    for b in bullets[:]:
-        b.move_counter += 1
-        if b.move_counter < BULLET_STEP_FRAMES:
-            continue
-        b.move_counter = 0
-
-        if b.has_target:
-            e2 = 2 * b.err
-            nr, nc = b.row, b.col
-            if e2 > -b.dy:
-                b.err -= b.dy
-                nc = b.col + b.sx
-            if e2 < b.dx:
-                b.err += b.dx
-                nr = b.row + b.sy
-        else:
-            nr, nc = b.row + b.dr, b.col + b.dc
-
-        if not is_location_valid(nr, nc) or ((nr, nc) in obstacle_set):
-            bullets.remove(b)
-            continue
-
-        if b.from_player:
-            hit = next((m for m in monsters if (m.row, m.col) == (nr, nc)), None)
-            if hit:
-                hit.hp -= b.damage
-                if hit.hp <= 0:
-                    death_marks.append({'row': hit.row, 'col': hit.col, 'timer': DEATH_MARK_DURATION})
-                    kill_count += 1
-                    score += hit.score
-                    monsters.remove(hit)
-                bullets.remove(b)
-            else:
-                b.row, b.col = nr, nc
-        else:
-            if (nr, nc) == (player.row, player.col):
-                if player.shield_timer <= 0:
-                    player.hp -= b.damage
-                bullets.remove(b)
-                continue
-            if any((m.row, m.col) == (nr, nc) for m in monsters):
-                bullets.remove(b)
-            else:
-                b.row, b.col = nr, nc
-
-
-def spawn_monsters_check():
-    """Countdown to spawn waves; create warning markers; respect monster cap."""
-    global spawn_timer
-    spawn_timer -= 1
-    if spawn_timer <= 0:
-        if len(monsters) < MONSTER_CAP:
-            to_spawn = 1
-            if score > 600: to_spawn = 3
-            elif score > 300: to_spawn = 2
-            to_spawn = min(to_spawn, MONSTER_CAP - len(monsters))
-            for _ in range(to_spawn):
-                m = spawn_monster()
-                if m:
-                    spawn_warnings.append({'row': m.row,'col': m.col,'phase': 0,'timer': 20,'monster': m})
-        interval = base_spawn_interval - score // 200
-        if interval < min_spawn_interval: interval = min_spawn_interval
-        spawn_timer = interval
-
-
-def process_spawn_warnings():
-    """Flash '!' for 6 phases (each 20 frames), then spawn if cell is free."""
-    for w in spawn_warnings[:]:
-        w['timer'] -= 1
-        if w['timer'] > 0: continue
-        w['phase'] += 1
-        if w['phase'] < 6:
-            w['timer'] = 20
-            continue
-        r, c = w['row'], w['col']
-        m = w['monster']
-        blocked = ((r, c) == (player.row, player.col)
-                   or (r, c) in obstacle_set
-                   or any(mm.row == r and mm.col == c for mm in monsters)
-                   or any(it.row == r and it.col == c for it in items))
-        if not blocked and len(monsters) < MONSTER_CAP:
-            monsters.append(m)
-        spawn_warnings.remove(w)
-
-
-def spawn_items_check():
-    """Fixed-interval item spawns with global cap."""
-    global item_spawn_timer
-    item_spawn_timer -= 1
-    if item_spawn_timer > 0: return
-    item_spawn_timer = ITEM_SPAWN_INTERVAL_FRAMES
-    if len(items) >= ITEM_CAP: return
-    it = spawn_item()
-    if it: items.append(it)
-
-
-def find_nearest_monster(pr, pc):
-    """Return nearest monster and direction hints (dr, dc) from player."""
-    if not monsters: return (None, 0, 0)
-    nearest = min(monsters, key=lambda m: abs(m.row - pr) + abs(m.col - pc))
-    dr = 0 if nearest.row == pr else (1 if nearest.row > pr else -1)
-    dc = 0 if nearest.col == pc else (1 if nearest.col > pc else -1)
-    return nearest, dr, dc
-
-
-def make_bullet_towards(sr, sc, tr, tc, damage, from_player):
-    """Create a bullet that steps toward target using Bresenham-like deltas."""
-    b = Bullet(sr, sc, 0, 0, damage, from_player)
-    dx = abs(tc - sc); dy = abs(tr - sr)
-    b.sx = 1 if tc > sc else (-1 if tc < sc else 0)
-    b.sy = 1 if tr > sr else (-1 if tr < sr else 0)
-    b.dx = dx; b.dy = dy
-    b.err = (dx - dy)
-    b.move_counter = 0
-    b.has_target = True
-    return b
-
-
-def auto_magic_shoot():
-    """Auto-shoot toward nearest monster while magic buff is active."""
-    if player.magic_timer <= 0: return
-    if player.magic_cooldown > 0:
-        player.magic_cooldown -= 1; return
-    target, _, _ = find_nearest_monster(player.row, player.col)
-    if target is None:
-        player.magic_cooldown = 3; return
-    bullets.append(make_bullet_towards(player.row, player.col, target.row, target.col, player.attack, True))
-    player.magic_cooldown = MAGIC_SHOOT_INTERVAL
+def read_player_keys():
+    """Return every key pressed since the last call as (perf_counter timestamp,
+    key), oldest first. The key reader stamps each key as it arrives; polled
+    keys are stamped when they are read."""
+    if key_reader is not None:
+        return key_reader.drain()
+    key = get_player_input()
+    return [(time.perf_counter(), key)] if key else []
 # ------------------------------------------------------------------------------
 
 
 
-# --- Initialization -----------------------------------------------------------
-player = Player(HEIGHT//2, WIDTH//2)
-obstacle_set = spawn_obstacles()
-monsters, bullets, items = [], [], []
-spawn_warnings, sword_effect_cells, death_marks = [], [], []
-score = kill_count = frame_count = 0
-
-# Monster spawn pacing
-base_spawn_interval = 60
-min_spawn_interval = 12
-spawn_timer = base_spawn_interval
-
-# Item spawn pacing
-item_spawn_timer = ITEM_SPAWN_INTERVAL_FRAMES
-
-show_start_screen()
-
-# Switch to alternate screen buffer and hide cursor for smooth drawing
-sys.stdout.write(ALT_SCREEN_ON + HIDE_CURSOR + CURSOR_HOME)
-sys.stdout.flush()
-
-game_start_real = time.time()
-start_time = game_start_real
-last_score_time = start_time
-last_frame_time = time.time()
-# ------------------------------------------------------------------------------
+# --- Main Loop ----------------------------------------------------------------
+def main(seed=None, record_path=None, profile=False, session_path=None, cast_path=None, play_path=None,
+         fog=False):
+    global key_reader
+    enable_ansi()
+    use_reader = have_termios and sys.stdin.isatty()
+    if not have_msvcrt and not use_reader and load_keyboard() is None:
+        print("keyboard library not found. Please install it with `pip install keyboard`.")
+        sys.exit(1)
 
+    if use_reader:
+        key_reader = TerminalKeyReader(sys.stdin.fileno())
+        key_reader.start()
+    profiler = FrameProfiler() if profile else None
+    cast = CastWriter(cast_path) if cast_path else None
+    try:
+        if play_path:
+            play_cast(play_path)
+        else:
+            if cast: cast.start()
+            run_game(seed, record_path, profiler, session_path, cast, fog)
+    finally:
+        if key_reader is not None:
+            key_reader.stop()
+            key_reader = None
+        if cast: cast.close()
+        sys.stdout.write(SHOW_CURSOR + ALT_SCREEN_OFF)
+        sys.stdout.flush()
+    if profiler:
+        print(profiler.report())
+        print(startup_report())
+    if cast:
+        print(f"Cast: {cast.written} frames written to {cast_path}, {cast.dropped} dropped")
+
+
+def run_game(seed=None, record_path=None, profiler=None, session_path=None, cast=None, fog=False):
+    # Put the start page up first and build the game behind it
+    show_start_screen()
+    mark_startup('start page')
+    if session_path and os.path.exists(session_path):
+        game = load_snapshot(session_path, Game)
+    else:
+        if session_path and seed is not None and not 0 <= seed < SEED_LIMIT:
+            # Fail now rather than when the session is saved on quitting
+            raise ValueError(f"seed {seed} can't be saved: it must be from 0 to 2**64 - 1")
+        game = Game(seed=seed, fog=fog)
+    game.profiler = profiler
+    recording = Recording(game.seed, game.fov is not None) if record_path else None
+    mark_startup('game ready')
+    wait_any_key_blocking()
+    mark_startup('key pressed')
 
+    # Switch to alternate screen buffer and hide cursor for smooth drawing
+    sys.stdout.write(ALT_SCREEN_ON + HIDE_CURSOR + CURSOR_HOME)
+    sys.stdout.flush()
 
-# --- Main Loop ----------------------------------------------------------------
-def main():
-    global last_frame_time
-    global sword_effect_cells
-    global frame_count
-    global current_time
-    global last_score_time
-    global score
-    global start_time
-
-    game_over = False
-    player_dead = False
-
-    while not game_over:
-        key = get_player_input()
-        if key == 'q':
-            game_over = True
-            player_dead = False
+    if RENDER_THREAD:
+        renderer = RenderThread(DiffRenderer(), profiler)
+        renderer.start()
+    else:
+        renderer = DiffRenderer(profiler)
+    camera = Camera()
+    clock = FixedStepClock()
+    # (timestamp, key) pairs wait here and are applied one per tick; the oldest
+    # are dropped when full.
+    pending_keys = deque(maxlen=INPUT_QUEUE_LIMIT)
+
+    quit_requested = False
+    while not game.is_over and not quit_requested:
+        if profiler: profiler.start_frame()
+        paused = False
+        for event in read_player_keys():
+            key = event[1]
+            if key == 'q':
+                quit_requested = True
+                break
+            if key == 'p':
+                paused = True
+                break
+            if key in 'wasdijkl':
+                pending_keys.append(event)
+        if quit_requested:
             break
-        if key == 'p':
-            paused_seconds = pause_and_countdown()
-            start_time += paused_seconds
-            last_score_time += paused_seconds
-            last_frame_time = time.time()
+        if paused:
+            if RENDER_THREAD: renderer.wait_idle()
+            pause_and_countdown()
+            renderer.invalidate()
+            pending_keys.clear()
+            clock.reset()
             continue
 
-        current_time = time.time()
-        if key or (current_time - last_frame_time >= FRAME_INTERVAL_SEC):
-            if key: process_player_action(key)
-            else:   sword_effect_cells = []
-
-            update_player_buffs()
-            update_monsters()
-            static_monster_attack()
-            update_bullets()
-            update_death_marks()
-
-            spawn_monsters_check()
-            process_spawn_warnings()
-            spawn_items_check()
-
-            frame_count += 1
-
-            # scoring: +1 per real second
-            now = time.time()
-            sec_gain = int(now - last_score_time)
-            if sec_gain >= 1:
-                score += sec_gain
-                last_score_time += sec_gain
-
-            last_frame_time = now
-            print_map()
-
-            if player.hp <= 0:
-                game_over = True
-                player_dead = True
+        if profiler: profiler.mark('input')
+        ticks = clock.due_ticks()
+        for _ in range(ticks):
+            pressed, key = pending_keys.popleft() if pending_keys else (None, None)
+            if profiler and key: profiler.key_applied(time.perf_counter() - pressed)
+            game.step(key, FRAME_INTERVAL_SEC)
+            if recording: recording.record_tick(game, key)
+            if game.is_over:
                 break
+        if ticks:
+            print_map(game, renderer, camera, cast)
+            mark_startup('first frame')
+            if profiler: profiler.end_frame()
         else:
-            time.sleep(0.005)
-
-    show_game_over()
+            time.sleep(clock.time_to_next())
+
+    if RENDER_THREAD: renderer.stop()
+    if recording: recording.save(record_path)
+    if session_path:
+        # Quitting keeps the run for next time; dying ends it
+        if game.is_over:
+            if os.path.exists(session_path): os.remove(session_path)
+        else:
+            save_snapshot(game, session_path)
+    show_game_over(game)
 # ------------------------------------------------------------------------------
 
-if __name__ == '__main__': main()
\ No newline at end of file
+mark_startup('imported')
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Mouse Knight's Survival Adventure")
+    parser.add_argument('--seed', type=int, help="seed for a reproducible run")
+    parser.add_argument('--width', type=int, default=WIDTH, help="map width in cells (the view follows the player)")
+    parser.add_argument('--height', type=int, default=HEIGHT, help="map height in cells")
+    parser.add_argument('--record', metavar='FILE', help="save the seed and every tick's key to FILE")
+    parser.add_argument('--replay', metavar='FILE', help="re-run a recording headless and verify it")
+    parser.add_argument('--profile', action='store_true', help="time each phase of the tick and show it beside the status line")
+    parser.add_argument('--session', metavar='FILE', help="resume the run saved in FILE, and save it there when you quit")
+    parser.add_argument('--cast', metavar='FILE', help="record every frame drawn to FILE, for watching with --play")
+    parser.add_argument('--play', metavar='FILE', help="watch a cast; seek with a/d, step frames with j/l")
+    parser.add_argument('--sync-render', action='store_true', help="paint on the tick thread instead of a render thread")
+    parser.add_argument('--fog', action='store_true', help="fog of war: see only what is in the knight's line of sight")
+    args = parser.parse_args()
+    RENDER_THREAD = not args.sync_render
+    if args.session and args.record:
+        parser.error("--session and --record can't be combined: a recording has to start at tick 0")
+    if args.seed is not None and not 0 <= args.seed < SEED_LIMIT:
+        parser.error("--seed must be from 0 to 2**64 - 1")
+    WIDTH, HEIGHT = args.width, args.height
+    if args.session and os.path.exists(args.session):
+        # A saved run keeps the map size it was started with
+        try:
+            HEIGHT, WIDTH = snapshot_map_size(args.session)
+        except ValueError as e:
+            parser.error(f"--session {args.session}: {e}")
+
+    if args.replay:
+        t0 = time.perf_counter()
+        game, bad_tick = replay_recording(args.replay)
+        took = time.perf_counter() - t0
+        print(f"Replayed {game.frame_count} ticks in {took:.2f} s "
+              f"(score {game.score}, kills {game.kill_count}, hp {game.player.hp})")
+        if bad_tick is not None:
+            print(f"State hash mismatch by tick {bad_tick}")
+            sys.exit(1)
+        print("State hashes match")
+    else:
+        main(args.seed, args.record, args.profile, args.session, args.cast, args.play, args.fog)
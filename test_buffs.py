@@ -0,0 +1,61 @@
+'''
+BUFF EXPIRY
+Buff countdowns became deadlines on the timer wheel; they must still run out
+on the tick the old per-tick decrement did. That loop decremented each timer
+in the buffs phase of every tick, the pickup tick included, so a pickup of
+N ticks at tick T was over from tick T + N - 1 on.
+
+    python -m pytest -q
+'''
+
+import main
+
+STRENGTH_TICKS, MAGIC_TICKS, SHIELD_TICKS = 600, 800, 500
+
+
+def pick_up(kind, seed=1):
+    """A game whose player has just picked up item `kind`; returns (game, pickup tick)."""
+    game = main.Game(monster_cap=0, seed=seed)
+    p = game.player
+    for dr, dc, key in ((0, 1, 'd'), (0, -1, 'a'), (1, 0, 's'), (-1, 0, 'w')):
+        cell = (p.row + dr, p.col + dc)
+        if main.is_location_valid(*cell) and cell not in game.obstacle_set and cell not in game.item_at:
+            break
+    game.add_item(main.Item(kind, *cell))
+    pickup = game.frame_count
+    game.step(key)
+    assert (p.row, p.col) == cell
+    return game, pickup
+
+
+def step_to(game, tick):
+    """Step until `tick` is the next tick to run."""
+    while game.frame_count < tick:
+        game.step(None)
+
+
+def test_strength_ends_on_the_old_tick():
+    game, t = pick_up('S')
+    step_to(game, t + STRENGTH_TICKS - 1)
+    assert game.player.length == 10
+    game.step(None)         # tick T + 599 resets it
+    assert game.player.length == main.PLAYER_WEAPON_LENGTH
+
+
+def test_shield_blocks_until_the_old_tick():
+    game, t = pick_up('D')
+    step_to(game, t + SHIELD_TICKS - 2)
+    hp = game.player.hp
+    game.hurt_player(5, 3)  # a hit in tick T + 498 is blocked
+    assert game.player.hp == hp
+    game.step(None)
+    game.hurt_player(5, 3)  # one in tick T + 499 lands
+    assert game.player.hp == hp - 5
+
+
+def test_magic_shoots_until_the_old_tick():
+    game, t = pick_up('M')
+    step_to(game, t + MAGIC_TICKS - 2)
+    assert game.player.magic_timer > 0     # tick T + 798 may still shoot
+    game.step(None)
+    assert game.player.magic_timer == 0    # tick T + 799 may not
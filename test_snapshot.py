@@ -0,0 +1,90 @@
+'''
+SNAPSHOT ROUND TRIPS
+A restored game must carry on exactly like the one that was saved: snapshot,
+restore, step both with the same keys and compare state_hash() every tick.
+
+    python -m pytest -q
+'''
+
+import random
+
+import pytest
+
+import main
+
+KEYS = (None, None, 'w', 'a', 's', 'd', 'i', 'j', 'k', 'l')
+
+
+def game_classes():
+    yield main.Game
+    try:
+        from horde import HordeGame
+    except ImportError:         # horde.py needs NumPy
+        return
+    yield HordeGame
+
+
+def play(game, ticks, seed):
+    rng = random.Random(seed)
+    for _ in range(ticks):
+        game.step(rng.choice(KEYS))
+        if game.is_over:
+            break
+
+
+@pytest.mark.parametrize('game_cls', list(game_classes()), ids=lambda cls: cls.__name__)
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_restored_game_continues_identically(game_cls, seed):
+    game = game_cls(seed=seed)
+    play(game, 1500, seed)
+    restored = main.restore_snapshot(main.snapshot_bytes(game), game_cls)
+    assert restored.state_hash() == game.state_hash()
+
+    rng = random.Random(seed + 100)
+    for tick in range(500):
+        if game.is_over:
+            break
+        key = rng.choice(KEYS)
+        game.step(key)
+        restored.step(key)
+        assert restored.state_hash() == game.state_hash(), f"diverged {tick + 1} ticks after the restore"
+
+
+def test_snapshot_file_round_trip(tmp_path):
+    game = main.Game(seed=5)
+    play(game, 300, 5)
+    path = tmp_path / 'save.mksn'
+    main.save_snapshot(game, path)
+    assert main.load_snapshot(path).state_hash() == game.state_hash()
+
+
+def test_truncated_snapshot_is_rejected(tmp_path):
+    game = main.Game(seed=5)
+    play(game, 300, 5)
+    data = main.snapshot_bytes(game)
+    path = tmp_path / 'short.mksn'
+    for size in (10, len(data) // 2, len(data) - 1):
+        path.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            main.load_snapshot(path)
+
+
+def test_header_of_short_or_foreign_file_is_rejected(tmp_path):
+    path = tmp_path / 'bad.mksn'
+    for data in (b'', b'MKSN', bytes(main.SNAPSHOT_HEADER.size - 1), b'X' * main.SNAPSHOT_HEADER.size):
+        path.write_bytes(data)
+        with pytest.raises(ValueError):
+            main.snapshot_map_size(path)
+        with pytest.raises(ValueError):
+            main.load_snapshot(path)
+
+
+def test_map_size_of_a_saved_game(tmp_path):
+    path = tmp_path / 'save.mksn'
+    main.save_snapshot(main.Game(seed=5), path)
+    assert main.snapshot_map_size(path) == (main.HEIGHT, main.WIDTH)
+
+
+def test_unstorable_seed_is_rejected():
+    with pytest.raises(ValueError):
+        main.snapshot_bytes(main.Game(seed=-1))
@@ -0,0 +1,148 @@
+'''
+BATCHED GAME ENVIRONMENTS
+VectorEnv runs N independent games in lockstep for agents and soak bots: one
+step() call takes N actions and fills shared NumPy arrays with every game's
+character grid (uint8), hp, score and buff timers, plus rewards and done flags.
+Finished games are reset in place through Game.reset() / Player.reset().
+Needs `pip install numpy`.
+
+    env = VectorEnv(64, seed=1)
+    obs = env.reset()
+    while True:
+        obs, rewards, dones = env.step(policy(obs))     # actions: 0..8, see ACTIONS
+'''
+
+import main
+from main import Game
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("The batched environments need NumPy. Please install it with `pip install numpy`.") from e
+
+
+
+# --- Encoding -----------------------------------------------------------------
+# Action codes: index into this tuple (0 = no key)
+ACTIONS = (None, 'w', 'a', 's', 'd', 'i', 'j', 'k', 'l')
+
+# Observation grids hold the glyph compose_frame would draw, as its ASCII code
+FLOOR, BORDER, OBSTACLE = ord(' '), ord('+'), ord('#')
+BULLET, PLAYER, WARNING, DEATH_MARK = ord('*'), ord('@'), ord('!'), ord('x')
+
+BUFFS = ('strength_timer', 'magic_timer', 'shield_timer')
+# ------------------------------------------------------------------------------
+
+
+
+# --- Environments -------------------------------------------------------------
+class VectorEnv:
+    """N games of the current map size stepped together.
+
+    The arrays in the observation dict and the reward/done arrays are
+    allocated once and overwritten by every step() and reset(); copy them to
+    keep a frame. A game is done when the player dies or, with max_ticks, when
+    it has run that long. It is then reset at once, so its observation is
+    already the first frame of the next run; episode_score and episode_ticks
+    keep the finished run's totals.
+    """
+
+    def __init__(self, n, seed=0, max_ticks=None, game_cls=Game, monster_cap=main.MONSTER_CAP):
+        self.n = n
+        self.max_ticks = max_ticks
+        self.games = [game_cls(monster_cap=monster_cap, seed=seed + i) for i in range(n)]
+        self.height, self.width = main.HEIGHT, main.WIDTH
+
+        self.obs = {
+            'grid': np.zeros((n, self.height, self.width), np.uint8),
+            'hp': np.zeros(n, np.int32),
+            'score': np.zeros(n, np.int32),
+            'buffs': np.zeros((n, len(BUFFS)), np.int32),
+        }
+        self.rewards = np.zeros(n, np.float32)
+        self.dones = np.zeros(n, bool)
+        self.episode_score = np.zeros(n, np.int32)
+        self.episode_ticks = np.zeros(n, np.int32)
+
+        # Border and obstacles per game, rebuilt when its obstacle_version moves on
+        self._base = np.zeros((n, self.height, self.width), np.uint8)
+        self._base_version = [None] * n
+        self._char_codes = {t: ord(s['char']) for t, s in main.monster_stats.items()}
+        self._type_codes = np.zeros(max(main.monster_stats) + 1, np.uint8)
+        for t, code in self._char_codes.items():
+            self._type_codes[t] = code
+
+    def reset(self):
+        """Reset every game and return the observation dict."""
+        for i, game in enumerate(self.games):
+            game.reset()
+            self._observe(i)
+        return self.obs
+
+    def step(self, actions):
+        """Advance every game one tick. `actions` holds one entry per game: an
+        ACTIONS index, or the key itself ('w'... or None). Returns
+        (obs, rewards, dones)."""
+        if isinstance(actions, np.ndarray) and actions.dtype.kind in 'iu':
+            actions = [ACTIONS[a] for a in actions.tolist()]
+        score, rewards, dones = self.obs['score'], self.rewards, self.dones
+        for i, (game, action) in enumerate(zip(self.games, actions)):
+            game.step(action)
+            rewards[i] = game.score - score[i]
+            done = game.is_over or (self.max_ticks is not None and game.frame_count >= self.max_ticks)
+            dones[i] = done
+            if done:
+                self.episode_score[i] = game.score
+                self.episode_ticks[i] = game.frame_count
+                game.reset()
+            self._observe(i)
+        return self.obs, rewards, dones
+
+    def _observe(self, i):
+        game, obs = self.games[i], self.obs
+        player = game.player
+        obs['hp'][i] = player.hp
+        obs['score'][i] = game.score
+        buffs = obs['buffs'][i]
+        for j, name in enumerate(BUFFS):
+            buffs[j] = getattr(player, name)
+
+        grid = obs['grid'][i]
+        grid[...] = self._static_layer(i)
+        flat = grid.reshape(-1)
+        W = self.width
+        # Same layering as compose_frame: items, bullets, monsters, player,
+        # sword trail (blank floor only), warnings, death marks
+        if game.items:
+            flat[[it.row * W + it.col for it in game.items]] = [ord(it.char) for it in game.items]
+        if game.bullets_at:
+            flat[[r * W + c for r, c in game.bullets_at]] = BULLET
+        if hasattr(game, 'store'):      # HordeGame: monsters are already columns
+            s = game.store
+            live = s.live_slots()
+            flat[s.row[live] * W + s.col[live]] = self._type_codes[s.type[live]]
+        elif game.monsters:
+            codes = self._char_codes
+            flat[[m.row * W + m.col for m in game.monsters]] = [codes[m.type] for m in game.monsters]
+        grid[player.row, player.col] = PLAYER
+        for r, c, ch in game.sword_effect_cells:
+            if grid[r, c] == FLOOR:
+                grid[r, c] = ord(ch)
+        for w in game.spawn_warnings:
+            if w['phase'] % 2 == 0:
+                grid[w['row'], w['col']] = WARNING
+        for dm in game.death_marks:
+            grid[dm['row'], dm['col']] = DEATH_MARK
+
+    def _static_layer(self, i):
+        game, base = self.games[i], self._base[i]
+        if self._base_version[i] != game.obstacle_version:
+            base.fill(FLOOR)
+            base[0, :] = base[-1, :] = BORDER
+            base[:, 0] = base[:, -1] = BORDER
+            if game.obstacle_set:
+                rows, cols = zip(*game.obstacle_set)
+                base[list(rows), list(cols)] = OBSTACLE
+            self._base_version[i] = game.obstacle_version
+        return base
+# ------------------------------------------------------------------------------